@@ -8,22 +8,47 @@ try:
     # Python 2
     from urllib import quote_plus
     from urllib import urlencode
-    from urllib import urlretrieve
+    from urllib2 import HTTPError, URLError
+    from urlparse import urlparse
 except ImportError:
     # Python 3
     from urllib.parse import quote_plus
     from urllib.parse import urlencode
-    from urllib.request import urlretrieve
-import feedparser
+    from urllib.parse import urlparse
+    from urllib.error import HTTPError, URLError
 import re
+from arxivanalysis import metrics
+from arxivanalysis import transport
+import os
+import time
+import socket
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 root_url = "http://export.arxiv.org/api/"
 
 
-def query(
+def fetch(url, timeout=60):
+    """
+    :param url: string
+    :param timeout: float, the socket timeout in seconds
+    :return: tuple of the http status (None if the server is unreachable) and the body bytes
+    """
+    try:
+        resp = transport.current().urlopen(url, timeout=timeout)
+    except HTTPError as e:
+        return e.code, b""
+    except URLError:
+        return None, b""
+    with resp:
+        return resp.getcode(), resp.read()
+
+
+def query_url(
     search_query="",
     id_list=[],
-    prune=True,
     start=0,
     max_results=10,
     sort_by="relevance",
@@ -43,22 +68,164 @@ def query(
     url_args = re.sub(
         "%2B", "+", url_args
     )  # to avoid the weird encoding url problem for arxiv API
-    url = root_url + "query?" + url_args
-    results = feedparser.parse(url)
-    if results.get("status") != 200:
+    return root_url + "query?" + url_args
+
+
+def fetch_query(url):
+    # raw bytes of the API response, raise for anything but 200
+    status, data = fetch(url)
+    if status != 200:
         # TODO: better error reporting
-        raise Exception(
-            "HTTP Error " + str(results.get("status", "no status")) + " in query"
-        )
-    else:
-        results = results["entries"]
-    results = [result for result in results if result.get("title", None)]
+        raise Exception("HTTP Error " + str(status or "no status") + " in query")
+    return data
+
+
+@metrics.instrument("arxiv.query")
+def query(
+    search_query="",
+    id_list=[],
+    prune=True,
+    start=0,
+    max_results=10,
+    sort_by="relevance",
+    sort_order="descending",
+):
+    import feedparser
+
+    url = query_url(search_query, id_list, start, max_results, sort_by, sort_order)
+    data = fetch_query(url)
+    results = parse_entries(feedparser.parse(data)["entries"], prune=prune)
+    metrics.count(items=len(results), nbytes=len(data))
+    return (url, results)
+
+
+_id_pattern = re.compile(
+    r"^(?:https?://(?:export\.)?arxiv\.org/(?:abs|pdf)/|arxiv:)?"
+    # new-style id, or archive, subject class and number of an old-style id
+    r"(?:(\d{4}\.\d{4,5})|([a-z][a-z\-]*)(?:\.[A-Z]{2})?/(\d{7}))"
+    r"(?:v\d+)?(?:\.pdf)?$",
+    re.IGNORECASE,
+)
+
+
+def canonical_id(arxiv_id):
+    """
+    :param arxiv_id: string, eg. "2405.01234v2", "arXiv:2405.01234", "cond-mat/0102536"
+                    or the abs/pdf url of the paper
+    :return: string, the id without version, None if it is not a valid arxiv id.
+            The subject class of old-style ids is dropped, "math.AG/0601001" is "math/0601001"
+    """
+    m = _id_pattern.match(arxiv_id.strip())
+    if m is None:
+        return None
+    if m.group(1):
+        return m.group(1)
+    return m.group(2).lower() + "/" + m.group(3)
+
+
+def id_chunks(id_list, chunk_size=100, max_url=2000):
+    """
+    split ids into chunks whose query url stays below max_url characters
+
+    :param id_list: list of strings of canonical arxiv id
+    :param chunk_size: int, the max number of ids in one chunk
+    :param max_url: int, the max length of the query url
+    :return: generator of lists of strings
+    """
+    budget = max_url - len(query_url(id_list=[], max_results=chunk_size))
+    chunk, size = [], 0
+    for i in id_list:
+        # the comma joining ids is escaped as %2C
+        n = len(quote_plus(i)) + 3
+        if chunk and (len(chunk) >= chunk_size or size + n > budget):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(i)
+        size += n
+    if chunk:
+        yield chunk
+
+
+def _query_chunk(chunk, limiter, retries=3, timeout=60):
+    """
+    :return: tuple of dict, canonical id: entry, list of ids without entry and bytes fetched
+    """
+    import feedparser
+
+    url = query_url(id_list=chunk, max_results=len(chunk))
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            time.sleep(min(3 * 2**attempt, 60))
+        limiter.wait(url)
+        status, data = fetch(url, timeout)
+        if status is not None and status < 500 and status != 429:
+            break
+    if status not in (200, 400):
+        raise Exception("HTTP Error " + str(status or "no status") + " in query")
+    entries = feedparser.parse(data)["entries"]
+    if status == 400 or any("api/errors" in e.get("id", "") for e in entries):
+        # one id is rejected by the API, the others are looked up in halves
+        if len(chunk) == 1:
+            return {}, list(chunk), len(data)
+        half = len(chunk) // 2
+        found, missing, nbytes = _query_chunk(chunk[:half], limiter, retries, timeout)
+        more = _query_chunk(chunk[half:], limiter, retries, timeout)
+        found.update(more[0])
+        return found, missing + more[1], len(data) + nbytes + more[2]
+    found = {}
+    for entry in parse_entries(entries, prune=False):
+        found[canonical_id(entry["arxiv_url"])] = entry
+    return found, [i for i in chunk if i not in found], len(data)
+
+
+def query_ids(
+    id_list,
+    chunk_size=100,
+    max_url=2000,
+    max_workers=3,
+    rate=1.0 / 3,
+    retries=3,
+    timeout=60,
+):
+    """
+    bulk lookup of ids through the API, chunks are queried concurrently under a rate limit
+
+    :param id_list: list of strings of canonical arxiv id, see ``canonical_id``
+    :param chunk_size: int, the max number of ids in one query
+    :param max_url: int, the max length of the query url
+    :param max_workers: int, the number of concurrent queries
+    :param rate: float, max requests per second, arxiv asks for one request every 3 seconds
+    :param retries: int, the number of retries for each query
+    :param timeout: float, the socket timeout in seconds
+    :return: generator of (dict, canonical id: raw entry, list of ids that do not exist),
+            one pair per chunk in the order chunks finish
+    """
+    limiter = RateLimiter(rate)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_query_chunk, chunk, limiter, retries, timeout)
+            for chunk in id_chunks(id_list, chunk_size, max_url)
+        ]
+        try:
+            for future in as_completed(futures):
+                found, missing, nbytes = future.result()
+                metrics.count(items=len(found), nbytes=nbytes)
+                yield found, missing
+        finally:
+            # chunks not started yet are dropped when one fails or the caller stops early
+            for future in futures:
+                future.cancel()
+
+
+def parse_entries(entries, prune=True):
+    # Post-processing of the entries parsed by feedparser from the API response
+    results = [result for result in entries if result.get("title", None)]
     for result in results:
         # Renamings and modifications
         mod_query_result(result)
         if prune:
             prune_query_result(result)
-    return (url, results)
+    return results
 
 
 def mod_query_result(result):
@@ -115,17 +282,218 @@ def to_slug(title):
     return filename
 
 
-def download(obj, dirname="./", prepend_id=False, slugify=False):
-    # Downloads file in obj (can be result or unique page) if it has a .pdf link
+def pdf_filename(obj, dirname="./", prepend_id=False, slugify=False):
+    # Local filename for the pdf of obj, None if obj has no pdf link or title
     if "pdf_url" in obj and "title" in obj and obj["pdf_url"] and obj["title"]:
         filename = obj["title"]
         if slugify:
             filename = to_slug(filename)
         if prepend_id:
             filename = obj["arxiv_url"].split("/")[-1] + "-" + filename
-        filename = dirname + filename + ".pdf"
+        return dirname + filename + ".pdf"
+    return None
+
+
+def download(obj, dirname="./", prepend_id=False, slugify=False):
+    # Downloads file in obj (can be result or unique page) if it has a .pdf link
+    filename = pdf_filename(obj, dirname, prepend_id, slugify)
+    if filename:
         # Download
-        urlretrieve(obj["pdf_url"], filename)
+        with transport.current().urlopen(obj["pdf_url"]) as resp:
+            with open(filename, "wb") as f:
+                shutil.copyfileobj(resp, f)
         return filename
     else:
         print("Object obj has no PDF URL, or has no title")
+
+
+class RateLimiter:
+    """
+    Thread safe limiter keeping a minimal interval between requests to the same host
+
+    :param rate: float, max number of requests per second for each host, None or 0 for no limit
+    """
+
+    def __init__(self, rate=1.0):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def _arxiv_id(obj):
+    if obj.get("arxiv_id"):
+        return obj["arxiv_id"]
+    return obj.get("arxiv_url", "").split("/")[-1]
+
+
+def _md5(filename, chunk_size=1 << 20):
+    h = hashlib.md5()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _fetch_pdf(
+    url, filename, limiter, retries=3, timeout=60, checksum=None, chunk_size=1 << 16
+):
+    """
+    download url to filename through a .part file, resuming the partial file when
+    the server honors range requests, and only renaming it to filename once the size
+    (and checksum if given) is validated.
+
+    :return: int, the number of bytes fetched over the network
+    """
+    part = filename + ".part"
+    received = 0
+    error = None
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            time.sleep(min(2**attempt, 30))
+        try:
+            offset = os.path.getsize(part) if os.path.exists(part) else 0
+            headers = {"Range": "bytes=%s-" % offset} if offset else {}
+            limiter.wait(url)
+            try:
+                resp = transport.current().urlopen(url, headers, timeout)
+            except HTTPError as e:
+                if e.code == 416 and offset:  # stale partial file, start over
+                    os.remove(part)
+                raise
+            with resp:
+                status = resp.getcode()
+                if offset and status != 206:  # range ignored by the server
+                    offset = 0
+                expected = None
+                content_range = resp.headers.get("Content-Range")
+                if status == 206 and content_range and "/" in content_range:
+                    total = content_range.split("/")[-1]
+                    expected = int(total) if total.isdigit() else None
+                elif resp.headers.get("Content-Length"):
+                    expected = offset + int(resp.headers["Content-Length"])
+                with open(part, "ab" if offset else "wb") as f:
+                    for chunk in iter(lambda: resp.read(chunk_size), b""):
+                        f.write(chunk)
+                        received += len(chunk)
+            size = os.path.getsize(part)
+            if expected is not None and size != expected:
+                raise IOError(
+                    "incomplete download of %s: %s/%s" % (url, size, expected)
+                )
+            if checksum and _md5(part) != checksum:
+                os.remove(part)
+                raise IOError("checksum mismatch for %s" % url)
+            os.replace(part, filename)
+            return received
+        except (HTTPError, URLError, IOError, socket.timeout) as e:
+            error = e
+            if isinstance(e, HTTPError) and e.code in (403, 404):
+                break
+    raise error
+
+
+def download_all(
+    objs,
+    dirname="./",
+    prepend_id=False,
+    slugify=False,
+    max_workers=4,
+    rate=1.0,
+    retries=3,
+    timeout=60,
+    checksums=None,
+    overwrite=False,
+    progress=None,
+):
+    """
+    Bulk download of pdfs through a bounded thread pool. Files already present are skipped,
+    partial files are resumed and only complete files are atomically moved into place.
+
+    :param objs: Paperls object or list of result dicts, entries without pdf_url fall back to
+                the pdf link derived from arxiv_id
+    :param dirname: string, the directory to save pdfs, with trailing slash
+    :param prepend_id: boolean, whether to prepend arxiv id to the filename
+    :param slugify: boolean, whether to slugify the title in the filename
+    :param max_workers: int, the number of concurrent downloads
+    :param rate: float, max requests per second for each host, None for no limit
+    :param retries: int, the number of retries for each file
+    :param timeout: float, the socket timeout in seconds
+    :param checksums: dict, arxiv_id: md5 hex digest, for validation of the downloaded files
+    :param overwrite: boolean, if true, files already present are downloaded again
+    :param progress: callable, called as progress(stats) after each file finishes,
+                    stats is the dict returned below as it stands at that moment
+    :return: dict, with the list of "downloaded", "skipped" filenames, the list of "failed"
+            (arxiv_id, error message) pairs, "bytes" fetched, "elapsed" seconds and "throughput" in bytes/s
+    """
+    objs = getattr(objs, "contents", objs)
+    checksums = checksums or {}
+    limiter = RateLimiter(rate)
+    stats = {
+        "total": 0,
+        "downloaded": [],
+        "skipped": [],
+        "failed": [],
+        "bytes": 0,
+        "elapsed": 0.0,
+        "throughput": 0.0,
+    }
+    jobs = []
+    for obj in objs:
+        obj = dict(obj)
+        if not obj.get("pdf_url") and _arxiv_id(obj):
+            obj["pdf_url"] = "https://arxiv.org/pdf/" + _arxiv_id(obj)
+        filename = pdf_filename(obj, dirname, prepend_id, slugify)
+        stats["total"] += 1
+        if filename is None:
+            stats["failed"].append((_arxiv_id(obj), "no PDF URL or title"))
+        elif os.path.exists(filename) and not overwrite:
+            stats["skipped"].append(filename)
+        else:
+            jobs.append((obj, filename))
+
+    start = time.monotonic()
+
+    def update(key, value):
+        stats[key].append(value)
+        stats["elapsed"] = time.monotonic() - start
+        if stats["elapsed"] > 0:
+            stats["throughput"] = stats["bytes"] / stats["elapsed"]
+        if progress is not None:
+            progress(stats)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                _fetch_pdf,
+                obj["pdf_url"],
+                filename,
+                limiter,
+                retries,
+                timeout,
+                checksums.get(_arxiv_id(obj)),
+            ): (obj, filename)
+            for obj, filename in jobs
+        }
+        for future in as_completed(futures):
+            obj, filename = futures[future]
+            try:
+                stats["bytes"] += future.result()
+            except Exception as e:
+                update("failed", (_arxiv_id(obj), str(e)))
+            else:
+                update("downloaded", filename)
+    stats["elapsed"] = time.monotonic() - start
+    if stats["elapsed"] > 0:
+        stats["throughput"] = stats["bytes"] / stats["elapsed"]
+    return stats
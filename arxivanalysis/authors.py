@@ -0,0 +1,139 @@
+"""
+hashed index from normalized author names to arxiv ids, for author-follow subscriptions
+
+Each author of a paper is indexed under the initial of the first given name and the last
+name, eg. "Jean-Pierre Dupont" under "j dupont". A followed name in any form, "J. P. Dupont",
+"Jean P. Dupont" or "M. Rossi", is looked up under the same key, and the candidates whose
+given names disagree with it, eg. "Marco Rossi" for "Maria Rossi", are dropped.
+"""
+
+import re
+import unicodedata
+
+_suffixes = ("jr", "sr", "ii", "iii", "iv")
+
+
+def name_tokens(name):
+    """
+    :param name: string, eg. "J.-P. Dupont", "Dupont, Jean-Pierre" or "José García-Pérez"
+    :return: list of strings, lowercase ascii given names then the last name
+    """
+    name = re.sub(r"\(.*?\)", " ", name)
+    if "," in name:
+        last, given = name.split(",", 1)
+        name = given + " " + last
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(ch for ch in name if not unicodedata.combining(ch)).lower()
+    name = re.sub(r"['’`]", "", name)
+    tokens = re.sub(r"[^\w\s\-]", " ", name).split()
+    if len(tokens) > 1 and tokens[-1] in _suffixes:
+        tokens = tokens[:-1]
+    if not tokens:
+        return []
+    # hyphens join the last name but separate given names, eg. Jean-Pierre, J.-P.
+    given = [t for g in tokens[:-1] for t in g.split("-") if t]
+    last = tokens[-1].strip("-")
+    return given + [last] if last else given
+
+
+def name_key(tokens):
+    """
+    :param tokens: list of strings, see ``name_tokens``
+    :return: string, the key of the name in the index, eg. "j dupont"
+    """
+    if len(tokens) == 1:
+        return tokens[0]
+    return tokens[0][0] + " " + tokens[-1]
+
+
+def given_names_agree(a, b):
+    """
+    :param a: list of strings, given names of one form of a name, eg. ["jean", "p"]
+    :param b: list of strings, given names of another form, eg. ["jean", "pierre"]
+    :return: bool, whether no given name contradicts the other, an initial agrees with
+            any name of that letter and a missing middle name with any
+    """
+    for x, y in zip(a, b):
+        if x != y and not ((len(x) == 1 or len(y) == 1) and x[0] == y[0]):
+            return False
+    return True
+
+
+class AuthorIndex:
+    """
+    name key: set of arxiv ids, updated incrementally as papers arrive
+
+    :param contents: iterable of content dicts, indexed at once
+    """
+
+    def __init__(self, contents=()):
+        self.index = {}
+        # arxiv_id: name tokens of each author, to check the given names of candidates
+        self.authors = {}
+        self.update(contents)
+
+    def add(self, content):
+        """
+        :param content: dict, one paper with "arxiv_id" and "authors"
+        """
+        arxiv_id = content["arxiv_id"]
+        names = [name_tokens(author) for author in content.get("authors") or []]
+        names = [tokens for tokens in names if tokens]
+        self.authors[arxiv_id] = names
+        for tokens in names:
+            self.index.setdefault(name_key(tokens), set()).add(arxiv_id)
+
+    def update(self, contents):
+        for content in contents:
+            self.add(content)
+
+    def lookup(self, name):
+        """
+        :param name: string, the followed name in any form, eg. "J. Dupont" or "Maria Rossi"
+        :return: set of strings, arxiv ids of papers by the author
+        """
+        tokens = name_tokens(name)
+        if not tokens:
+            return set()
+        given, last = tokens[:-1], tokens[-1]
+        return {
+            arxiv_id
+            for arxiv_id in self.index.get(name_key(tokens), ())
+            if any(
+                a[-1] == last and given_names_agree(given, a[:-1])
+                for a in self.authors[arxiv_id]
+            )
+        }
+
+    def follow(self, authors):
+        """
+        :param authors: iterable of strings, the followed names
+        :return: dict, arxiv_id: list of the followed names among its authors
+        """
+        hits = {}
+        for name in authors:
+            for arxiv_id in self.lookup(name):
+                hits.setdefault(arxiv_id, []).append(name)
+        return hits
+
+    def __contains__(self, name):
+        return bool(self.lookup(name))
+
+    def __len__(self):
+        return len(self.index)
+
+
+def follow_all(indexes, authors):
+    """
+    resolve followed names in several indexes, eg. one per subject, without merging them
+
+    :param indexes: iterable of AuthorIndex
+    :param authors: iterable of strings, the followed names
+    :return: dict, arxiv_id: list of the followed names among its authors
+    """
+    hits = {}
+    for index in indexes:
+        for arxiv_id, names in index.follow(authors).items():
+            names = [name for name in names if name not in hits.get(arxiv_id, ())]
+            hits.setdefault(arxiv_id, []).extend(names)
+    return hits
@@ -0,0 +1,187 @@
+"""
+persistent per user ledger of delivered papers, to skip them before matching
+"""
+
+import hashlib
+import sqlite3
+from datetime import date, timedelta
+
+
+class BloomFilter:
+    """
+    fixed size bloom filter over strings
+
+    :param nbits: int, the number of bits
+    :param nhashes: int, the number of hash functions
+    :param bits: bytes, the serialized bits to restore from
+    """
+
+    def __init__(self, nbits=1 << 16, nhashes=7, bits=None):
+        self.nbits = nbits
+        self.nhashes = nhashes
+        self.bits = bytearray(bits) if bits is not None else bytearray(nbits // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.nbits for i in range(self.nhashes)]
+
+    def add(self, key):
+        for p in self._positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    @property
+    def capacity(self):
+        # number of keys keeping the false positive rate around 1% for 7 hashes
+        return self.nbits // 10
+
+
+class SentLedger:
+    """
+    ids of papers delivered to each user, an exact set in sqlite with a bloom filter per user
+    in front, so that most ids never delivered are rejected without touching the database
+
+    :param path: string, the sqlite database file
+    :param nbits: int, the initial size of bloom filters, they grow when full
+    """
+
+    def __init__(self, path, nbits=1 << 16):
+        self.path = path
+        self.nbits = nbits
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sent (
+                user TEXT NOT NULL,
+                arxiv_id TEXT NOT NULL,
+                sent_date TEXT NOT NULL,
+                PRIMARY KEY (user, arxiv_id)
+            );
+            CREATE INDEX IF NOT EXISTS sent_date ON sent (sent_date);
+            CREATE TABLE IF NOT EXISTS filters (
+                user TEXT PRIMARY KEY,
+                nbits INTEGER NOT NULL,
+                nhashes INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                bits BLOB NOT NULL
+            );
+            """)
+        self._filters = {}
+
+    def _filter(self, user):
+        if user not in self._filters:
+            row = self.conn.execute(
+                "SELECT nbits, nhashes, count, bits FROM filters WHERE user = ?",
+                (user,),
+            ).fetchone()
+            if row is None:
+                self._filters[user] = [BloomFilter(self.nbits), 0]
+            else:
+                self._filters[user] = [BloomFilter(row[0], row[1], row[3]), row[2]]
+        return self._filters[user]
+
+    def _rebuild(self, user):
+        count = self.conn.execute(
+            "SELECT COUNT(*) FROM sent WHERE user = ?", (user,)
+        ).fetchone()[0]
+        nbits = self.nbits
+        while nbits // 10 < count:
+            nbits *= 2
+        bloom = BloomFilter(nbits)
+        for (arxiv_id,) in self.conn.execute(
+            "SELECT arxiv_id FROM sent WHERE user = ?", (user,)
+        ):
+            bloom.add(arxiv_id)
+        self._filters[user] = [bloom, count]
+        self._save_filter(user)
+
+    def _save_filter(self, user):
+        bloom, count = self._filters[user]
+        self.conn.execute(
+            "INSERT OR REPLACE INTO filters (user, nbits, nhashes, count, bits) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (user, bloom.nbits, bloom.nhashes, count, bytes(bloom.bits)),
+        )
+
+    def sent(self, user, id_list):
+        """
+        :param user: string, eg. the email address
+        :param id_list: iterable of strings of arxiv id
+        :return: set of the ids already delivered to the user
+        """
+        bloom = self._filter(user)[0]
+        candidates = [i for i in id_list if i in bloom]
+        found = set()
+        for i in range(0, len(candidates), 500):
+            chunk = candidates[i : i + 500]
+            found.update(
+                r[0]
+                for r in self.conn.execute(
+                    "SELECT arxiv_id FROM sent WHERE user = ? AND arxiv_id IN (%s)"
+                    % ",".join("?" * len(chunk)),
+                    [user] + chunk,
+                )
+            )
+        return found
+
+    def unsent(self, user, contents):
+        """
+        :param user: string
+        :param contents: list of content dicts
+        :return: list of the papers not delivered to the user yet
+        """
+        sent = self.sent(user, [c["arxiv_id"] for c in contents])
+        return [c for c in contents if c["arxiv_id"] not in sent]
+
+    def add(self, user, id_list, sent_date=None):
+        """
+        record ids as delivered to the user
+
+        :param user: string
+        :param id_list: iterable of strings of arxiv id
+        :param sent_date: string, eg. "2024-05-20", default to today
+        """
+        sent_date = sent_date or date.today().strftime("%Y-%m-%d")
+        id_list = list(id_list)
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO sent (user, arxiv_id, sent_date) VALUES (?, ?, ?)",
+                [(user, i, sent_date) for i in id_list],
+            )
+            entry = self._filter(user)
+            entry[1] += self.conn.total_changes - before
+            if entry[1] > entry[0].capacity:
+                self._rebuild(user)
+            else:
+                for i in id_list:
+                    entry[0].add(i)
+                self._save_filter(user)
+
+    def expire(self, days):
+        """
+        forget deliveries older than days, bloom filters of affected users are rebuilt
+
+        :param days: int
+        :return: int, the number of records removed
+        """
+        cutoff = (date.today() - timedelta(days=days)).strftime("%Y-%m-%d")
+        users = [
+            r[0]
+            for r in self.conn.execute(
+                "SELECT DISTINCT user FROM sent WHERE sent_date < ?", (cutoff,)
+            )
+        ]
+        with self.conn:
+            removed = self.conn.execute(
+                "DELETE FROM sent WHERE sent_date < ?", (cutoff,)
+            ).rowcount
+            for user in users:
+                self._rebuild(user)
+        return removed
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,219 @@
+"""
+compiled keyword matchers, cached by the content hash of normalized keyword sets
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from arxivanalysis.paperls import kw_lst2dict, match_text
+
+
+def normalize_choices(choices):
+    """
+    normalize keywords to the standard dict of keyword: weight
+
+    :param choices: dict, list of strings, or string of the path of a file with one keyword per line
+    :return: dict, keywords stripped, empty ones dropped
+    """
+    if isinstance(choices, str):
+        if not choices:
+            return {}
+        with open(choices, "r") as datafile:
+            choices = [line for line in datafile]
+    if isinstance(choices, dict):
+        items = list(choices.items())
+    elif isinstance(choices, list):
+        items = list(kw_lst2dict([c.strip() for c in choices if c.strip()]).items())
+    else:
+        return {}
+    kwdict = {}
+    for kw, weight in items:
+        kw = kw.strip()
+        if kw and kw not in kwdict:
+            kwdict[kw] = weight
+    return kwdict
+
+
+def choices_hash(kwdict):
+    """
+    :param kwdict: dict, normalized keywords
+    :return: string, hex digest identifying the keyword set, independent of dict order
+    """
+    text = json.dumps(sorted(kwdict.items()), ensure_ascii=False)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class Matcher:
+    """
+    keyword set compiled for matching, the drop-in for the choices dict of ``Paperls.interest_match``.
+
+    Keywords are preprocessed once, and the processed paper texts and keyword scores
+    are shared through the cache by all matchers created from it.
+
+    :param kwdict: dict, normalized keywords
+    :param cache: MatcherCache, the shared cache
+    :param compiled: list, the precomputed state from an earlier run
+    """
+
+    def __init__(self, kwdict, cache=None, compiled=None):
+        from fuzzywuzzy import utils
+
+        self.choices = kwdict
+        self.key = choices_hash(kwdict)
+        self.cache = cache if cache is not None else MatcherCache()
+        if compiled is None:
+            compiled = [
+                (kw, weight, utils.full_process(kw, force_ascii=True))
+                for kw, weight in kwdict.items()
+            ]
+        self.compiled = compiled
+
+    def keyword_match(self, text, threhold=(90, 80)):
+        """
+        the same as ``paperls.keyword_match`` with the keywords of this matcher
+        """
+        from fuzzywuzzy import fuzz
+
+        processed, scores = self.cache.text_state(text)
+        r = []
+        for kw, _, pkw in self.compiled:
+            # keys are only dropped with evicted keywords, a race at worst computes one twice
+            score = scores.get(kw)
+            if score is None:
+                score = (
+                    fuzz.token_set_ratio(pkw, processed, full_process=False),
+                    fuzz.partial_ratio(kw, text),
+                )
+                scores[kw] = score
+            tsr_score, pr_score = score
+            if tsr_score > threhold[0] or pr_score > threhold[1]:
+                r.append((kw, tsr_score, pr_score))
+        return r
+
+    def match(self, content):
+        """
+        match one paper in place, setting its "keyword" and "weight"
+
+        :param content: dict, one paper in the shape of ``Paperls.contents``
+        :return: dict, the same paper
+        """
+        content["keyword"] = self.keyword_match(match_text(content))
+        content["weight"] = sum([self.choices[kw[0]] for kw in content["keyword"]])
+        return content
+
+    def __getitem__(self, kw):
+        return self.choices[kw]
+
+    def __iter__(self):
+        return iter(self.choices)
+
+    def __len__(self):
+        return len(self.choices)
+
+
+class MatcherCache:
+    """
+    matchers keyed by the content hash of their keywords, so identical profiles share one.
+
+    With a path, compiled keyword sets and the hashes of keyword files (by mtime and size)
+    are persisted, so unchanged profiles are neither re-read nor recompiled in later runs.
+    The cache is safe to share between threads, eg. the request threads of the service.
+
+    :param path: string, the json file of the cache, None for an in-memory cache
+    :param max_texts: int, the max number of paper texts whose processed form and scores are kept
+    :param max_matchers: int, the max number of matchers kept, least recently used first out,
+                        None for no bound, eg. for the known profiles of run-mail.py
+    """
+
+    def __init__(self, path=None, max_texts=20000, max_matchers=None):
+        self.path = path
+        self.max_texts = max_texts
+        self.max_matchers = max_matchers
+        self.matchers = OrderedDict()
+        self.compiled = {}
+        self.sources = {}
+        self.texts = {}
+        self.hits = 0
+        self._lock = threading.RLock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.compiled = {
+                k: [tuple(c) for c in v] for k, v in data["compiled"].items()
+            }
+            self.sources = data["sources"]
+
+    def text_state(self, text):
+        # processed text and the per keyword scores against it
+        with self._lock:
+            state = self.texts.get(text)
+            if state is None:
+                from fuzzywuzzy import utils
+
+                if len(self.texts) >= self.max_texts:
+                    self.texts.clear()
+                state = (utils.full_process(text, force_ascii=True), {})
+                self.texts[text] = state
+            return state
+
+    def _normalize(self, choices):
+        if isinstance(choices, str) and choices and os.path.exists(choices):
+            st = os.stat(choices)
+            source = self.sources.get(choices)
+            if source and source[:2] == [st.st_mtime, st.st_size]:
+                key = source[2]
+                if key in self.compiled:
+                    return None, key
+            kwdict = normalize_choices(choices)
+            self.sources[choices] = [st.st_mtime, st.st_size, choices_hash(kwdict)]
+            return kwdict, self.sources[choices][2]
+        kwdict = normalize_choices(choices)
+        return kwdict, choices_hash(kwdict)
+
+    def get(self, choices):
+        """
+        :param choices: anything accepted by ``normalize_choices``
+        :return: Matcher, shared with every earlier profile of the same keywords
+        """
+        with self._lock:
+            kwdict, key = self._normalize(choices)
+            if key in self.matchers:
+                self.hits += 1
+                self.matchers.move_to_end(key)
+                return self.matchers[key]
+            compiled = self.compiled.get(key)
+            if compiled is not None:
+                self.hits += 1
+            if kwdict is None:
+                kwdict = {kw: weight for kw, weight, _ in compiled}
+            matcher = Matcher(kwdict, self, compiled)
+            self.compiled[key] = matcher.compiled
+            self.matchers[key] = matcher
+            if self.max_matchers is not None and len(self.matchers) > self.max_matchers:
+                self._evict()
+            return matcher
+
+    def _evict(self):
+        # the least recently used matcher, with the scores of keywords no other matcher has
+        key, matcher = self.matchers.popitem(last=False)
+        self.compiled.pop(key, None)
+        live = set()
+        for m in self.matchers.values():
+            live.update(m.choices)
+        stale = [kw for kw in matcher.choices if kw not in live]
+        if stale:
+            for _, scores in self.texts.values():
+                for kw in stale:
+                    scores.pop(kw, None)
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with self._lock:
+            data = {"compiled": dict(self.compiled), "sources": dict(self.sources)}
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
@@ -0,0 +1,262 @@
+"""
+optional per-stage instrumentation of the pipeline, exported as json or prometheus textfile
+"""
+
+import os
+import json
+import time
+import functools
+import threading
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+_recorder = None
+
+
+class Recorder:
+    """
+    collects wall time, item counts, bytes fetched and peak memory for each stage
+
+    :param trace_memory: boolean, if true, peak memory of each stage is measured by tracemalloc,
+                        otherwise the peak rss of the process when the stage ends is recorded
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_tracing = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def close(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def extend(self, events):
+        """
+        add events recorded elsewhere, eg. by a forked worker process
+
+        :param events: list of event dicts, as in the json export
+        """
+        with self._lock:
+            self.events.extend(events)
+
+    def summary(self):
+        """
+        aggregate events by stage
+
+        :return: dict, stage: dict of calls, wall_seconds, items, bytes and peak_memory_bytes
+        """
+        stages = {}
+        with self._lock:
+            events = list(self.events)
+        for e in events:
+            s = stages.setdefault(
+                e["stage"],
+                {
+                    "calls": 0,
+                    "wall_seconds": 0.0,
+                    "items": 0,
+                    "bytes": 0,
+                    "peak_memory_bytes": 0,
+                },
+            )
+            s["calls"] += 1
+            s["wall_seconds"] += e["wall_seconds"]
+            s["items"] += e["items"]
+            s["bytes"] += e["bytes"]
+            s["peak_memory_bytes"] = max(s["peak_memory_bytes"], e["peak_memory_bytes"])
+        return stages
+
+    def to_json(self, path=None):
+        """
+        :param path: string, if given, the json is also written to this file
+        :return: string, json with the per stage summary and all raw events
+        """
+        with self._lock:
+            events = list(self.events)
+        text = json.dumps({"stages": self.summary(), "events": events}, indent=2)
+        if path is not None:
+            _atomic_write(path, text)
+        return text
+
+    def to_prometheus(self, path=None, prefix="arxivanalysis"):
+        """
+        :param path: string, if given, the metrics are also written to this file,
+                    eg. in the textfile collector directory of node_exporter
+        :param prefix: string, the prefix of metric names
+        :return: string, metrics in prometheus text exposition format
+        """
+        metrics = [
+            ("stage_calls_total", "calls", "counter", "Number of calls of each stage."),
+            (
+                "stage_seconds_total",
+                "wall_seconds",
+                "counter",
+                "Wall time spent in each stage.",
+            ),
+            ("stage_items_total", "items", "counter", "Items handled by each stage."),
+            ("stage_bytes_total", "bytes", "counter", "Bytes fetched by each stage."),
+            (
+                "stage_peak_memory_bytes",
+                "peak_memory_bytes",
+                "gauge",
+                "Peak memory observed in each stage.",
+            ),
+        ]
+        stages = self.summary()
+        lines = []
+        for name, key, kind, doc in metrics:
+            name = prefix + "_" + name
+            lines.append("# HELP %s %s" % (name, doc))
+            lines.append("# TYPE %s %s" % (name, kind))
+            for stage, s in sorted(stages.items()):
+                lines.append('%s{stage="%s"} %s' % (name, stage, s[key]))
+        text = "\n".join(lines) + "\n"
+        if path is not None:
+            _atomic_write(path, text)
+        return text
+
+
+class _Stage:
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        self.items = 0
+        self.nbytes = 0
+        self.peak = 0
+
+    def __enter__(self):
+        stack = self.recorder._stack()
+        if self.recorder.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+        stack.append(self)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.t0
+        stack = self.recorder._stack()
+        stack.pop()
+        if self.recorder.trace_memory:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+        elif resource is not None:
+            # ru_maxrss is in kilobytes on linux
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        event = {
+            "stage": self.name,
+            "start": time.time() - wall,
+            "wall_seconds": wall,
+            "items": self.items,
+            "bytes": self.nbytes,
+            "peak_memory_bytes": self.peak,
+            "error": exc_type.__name__ if exc_type is not None else None,
+        }
+        with self.recorder._lock:
+            self.recorder.events.append(event)
+        return False
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_null_stage = _NullStage()
+
+
+def _atomic_write(path, text):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def enable(trace_memory=False):
+    """
+    turn on instrumentation for the current process
+
+    :param trace_memory: boolean, see ``Recorder``
+    :return: Recorder, the active recorder
+    """
+    global _recorder
+    disable()
+    _recorder = Recorder(trace_memory=trace_memory)
+    return _recorder
+
+
+def disable():
+    """
+    turn off instrumentation
+
+    :return: Recorder or None, the recorder which was active
+    """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.close()
+    return recorder
+
+
+def get_recorder():
+    return _recorder
+
+
+def stage(name):
+    """
+    context manager timing the enclosed block as stage ``name``, no-op if disabled
+    """
+    if _recorder is None:
+        return _null_stage
+    return _Stage(_recorder, name)
+
+
+def count(items=0, nbytes=0):
+    """
+    attribute items and bytes fetched to the innermost running stage, no-op if disabled
+    """
+    if _recorder is None:
+        return
+    stack = _recorder._stack()
+    if stack:
+        stack[-1].items += items
+        stack[-1].nbytes += nbytes
+
+
+def instrument(name):
+    """
+    decorator recording each call of the function as stage ``name``
+    """
+
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kws):
+            if _recorder is None:
+                return f(*args, **kws)
+            with _Stage(_recorder, name):
+                return f(*args, **kws)
+
+        return wrapper
+
+    return decorator
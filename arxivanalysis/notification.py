@@ -2,9 +2,8 @@
 module for send html email of summary of highlight on arxiv
 """
 
-import smtplib
-from email.mime.text import MIMEText
-from email.utils import formataddr
+from arxivanalysis import metrics
+from arxivanalysis import transport
 
 
 def makeauthorlink(authorname):
@@ -64,6 +63,7 @@ def makemailcontent(headline, contents):
     )
 
 
+@metrics.instrument("sendmail")
 def sendmail(
     sender, sender_alias, password, server, port, user, user_alias, title, content
 ):
@@ -81,6 +81,9 @@ def sendmail(
     :param content: string, the content of the email
     :return: boolen, true for success sending
     """
+    from email.mime.text import MIMEText
+    from email.utils import formataddr
+
     ret = True
     try:
         msg = MIMEText(content, "html", "utf-8")
@@ -88,9 +91,11 @@ def sendmail(
         msg["To"] = formataddr([user_alias, user])
         msg["Subject"] = title
 
-        server = smtplib.SMTP_SSL(server, port)
+        server = transport.current().smtp(server, port)
         server.login(sender, password)
-        server.sendmail(sender, [user], msg.as_string())
+        body = msg.as_string()
+        server.sendmail(sender, [user], body)
+        metrics.count(items=1, nbytes=len(body))
         server.quit()
     except Exception:
         ret = False
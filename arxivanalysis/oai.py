@@ -0,0 +1,214 @@
+"""
+bulk metadata harvester through the OAI-PMH interface of arxiv
+"""
+
+import re
+import time
+import xml.etree.ElementTree as ET
+from arxivanalysis import metrics
+from arxivanalysis import transport
+from arxivanalysis.cons import category
+from arxivanalysis.paperls import announce_date_converter
+
+try:
+    # Python 2
+    from urllib import urlencode
+    from urllib2 import HTTPError
+except ImportError:
+    # Python 3
+    from urllib.parse import urlencode
+    from urllib.error import HTTPError
+
+oai_url = "http://export.arxiv.org/oai2"
+
+_oai = "{http://www.openarchives.org/OAI/2.0/}"
+_arxiv = "{http://arxiv.org/OAI/arXiv/}"
+
+
+class OAIException(Exception):
+    """
+    :param code: string, the OAI-PMH error code, eg. "badResumptionToken"
+    :param message: string
+    """
+
+    def __init__(self, code, message=None):
+        Exception.__init__(self, "%s: %s" % (code, message))
+        self.code = code
+
+
+def _text(elem, path):
+    node = elem.find(path)
+    if node is None or node.text is None:
+        return None
+    return re.sub(r"\s+", " ", node.text).strip()
+
+
+def record2content(record):
+    """
+    convert one OAI record in arXiv metadata format to the content dict shape of Paperls
+
+    :param record: xml.etree.ElementTree.Element, the <record> element
+    :return: dict, None for deleted records
+    """
+    header = record.find(_oai + "header")
+    if header is not None and header.get("status") == "deleted":
+        return None
+    meta = record.find(_oai + "metadata/" + _arxiv + "arXiv")
+    if meta is None:
+        return None
+    c = {}
+    c["arxiv_id"] = _text(meta, _arxiv + "id")
+    c["arxiv_url"] = "https://arxiv.org/abs/" + c["arxiv_id"]
+    c["title"] = _text(meta, _arxiv + "title") or ""
+    c["summary"] = _text(meta, _arxiv + "abstract") or ""
+    c["authors"] = []
+    for author in meta.iter(_arxiv + "author"):
+        name = " ".join(
+            filter(
+                None,
+                [
+                    _text(author, _arxiv + "forenames"),
+                    _text(author, _arxiv + "keyname"),
+                    _text(author, _arxiv + "suffix"),
+                ],
+            )
+        )
+        c["authors"].append(name)
+    c["subject_abbr"] = (_text(meta, _arxiv + "categories") or "").split()
+    c["subject"] = [category.get(d, "") + " (%s)" % d for d in c["subject_abbr"]]
+    c["arxiv_comment"] = _text(meta, _arxiv + "comments")
+    c["journal_reference"] = _text(meta, _arxiv + "journal-ref")
+    c["doi"] = _text(meta, _arxiv + "doi")
+    # only the day of the first version is known, the announce date is approximated from it
+    created = _text(meta, _arxiv + "created")
+    c["announce_date"] = (
+        announce_date_converter(time.strptime(created, "%Y-%m-%d")) if created else None
+    )
+    return c
+
+
+def list_records_url(
+    base_url=oai_url, from_date=None, until=None, set_=None, resumption_token=None
+):
+    if resumption_token:
+        args = {"verb": "ListRecords", "resumptionToken": resumption_token}
+    else:
+        args = {"verb": "ListRecords", "metadataPrefix": "arXiv"}
+        if from_date:
+            args["from"] = from_date
+        if until:
+            args["until"] = until
+        if set_:
+            args["set"] = set_
+    return base_url + "?" + urlencode(args)
+
+
+def _open(url, retries=5, timeout=120):
+    # arxiv answers 503 with Retry-After for flow control
+    for attempt in range(retries + 1):
+        try:
+            return transport.current().urlopen(url, timeout=timeout)
+        except HTTPError as e:
+            if e.code != 503 or attempt == retries:
+                raise
+            wait = e.headers.get("Retry-After", "")
+            time.sleep(int(wait) if wait.isdigit() else 10 * (attempt + 1))
+
+
+def parse_page(stream):
+    """
+    stream parse one ListRecords response
+
+    :param stream: file like object of the response
+    :return: generator of content dicts, the generator returns the resumption token
+            (None on the last page) as its StopIteration value
+    """
+    token = None
+    for _, elem in ET.iterparse(stream, events=("end",)):
+        if elem.tag == _oai + "record":
+            c = record2content(elem)
+            elem.clear()
+            if c is not None:
+                yield c
+        elif elem.tag == _oai + "resumptionToken":
+            token = (elem.text or "").strip() or None
+        elif elem.tag == _oai + "error":
+            if elem.get("code") == "noRecordsMatch":
+                return None
+            raise OAIException(elem.get("code"), elem.text)
+    return token
+
+
+def iter_pages(
+    base_url=oai_url,
+    from_date=None,
+    until=None,
+    set_=None,
+    resumption_token=None,
+    delay=3.0,
+):
+    """
+    fetch ListRecords pages, following resumption tokens
+
+    :param base_url: string, the OAI-PMH endpoint
+    :param from_date: string, eg. "2024-05-01", lower bound of the record datestamp
+    :param until: string, upper bound of the record datestamp
+    :param set_: string, OAI set, eg. "physics:cond-mat" or "cs"
+    :param resumption_token: string, resume the list from this token
+    :param delay: float, seconds to wait between requests
+    :return: generator of (list of content dicts, token for the next page or None)
+    """
+    while True:
+        url = list_records_url(base_url, from_date, until, set_, resumption_token)
+        with metrics.stage("oai.page"):
+            resp = _open(url)
+            with resp:
+                page = []
+                parser = parse_page(resp)
+                while True:
+                    try:
+                        page.append(next(parser))
+                    except StopIteration as e:
+                        resumption_token = e.value
+                        break
+            metrics.count(items=len(page))
+        yield page, resumption_token
+        if resumption_token is None:
+            return
+        if delay:
+            time.sleep(delay)
+
+
+def harvest(store, from_date=None, until=None, set_=None, base_url=oai_url, delay=3.0):
+    """
+    harvest metadata into the store, page by page.
+
+    Each page is inserted together with the resumption token for the next one, so an
+    interrupted harvest with the same arguments resumes from the last finished page.
+    A saved token arxiv no longer accepts is dropped and the harvest starts again from
+    from_date, papers already stored are replaced by the same rows.
+
+    :param store: arxivanalysis.store.Store
+    :param from_date: string, eg. "2024-05-01"
+    :param until: string, eg. "2024-05-31"
+    :param set_: string, OAI set, eg. "physics:cond-mat"
+    :param base_url: string, the OAI-PMH endpoint
+    :param delay: float, seconds to wait between requests
+    :return: int, the number of papers inserted in this run
+    """
+    key = "oai:%s:%s:%s:%s" % (base_url, set_ or "", from_date or "", until or "")
+    saved = token = store.get_state(key)
+    total = 0
+    try:
+        for page, token in iter_pages(base_url, from_date, until, set_, token, delay):
+            # the checkpoint is cleared with the last page
+            total += store.insert_many(page, state={key: token})
+    except OAIException as e:
+        # only the token of an earlier run may have expired, not one just issued
+        if e.code != "badResumptionToken" or saved is None or token != saved:
+            raise
+        # resumption tokens expire, the checkpoint is stale
+        store.set_state(key, None)
+        for page, token in iter_pages(base_url, from_date, until, set_, None, delay):
+            total += store.insert_many(page, state={key: token})
+    return total
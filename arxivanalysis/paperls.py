@@ -1,17 +1,17 @@
 """
 keyword based match for arxiv content
+
+fuzzywuzzy, bs4, feedparser, the network and the mail utilities are imported in the functions
+using them, so that importing this module stays cheap for short lived processes
 """
 
-from fuzzywuzzy import fuzz
-import requests
-from bs4 import BeautifulSoup
 import re
 from datetime import date, timedelta
-from arxivanalysis.arxiv import query
-from arxivanalysis.notification import sendmail, makemailcontent
 from datetime import datetime
 from arxivanalysis.rake import Rake
 from arxivanalysis.cons import weekdaylist, category
+from arxivanalysis.authors import AuthorIndex
+from arxivanalysis import metrics
 
 
 class arxivException(Exception):
@@ -33,6 +33,7 @@ class Paperls:
     :param sort_order: string, only available for mode 1, see arxiv api doc
     """
 
+    @metrics.instrument("paperls.init")
     def __init__(
         self,
         search_mode=1,
@@ -43,7 +44,10 @@ class Paperls:
         sort_by="relevance",
         sort_order="descending",
     ):
+        self._author_index = AuthorIndex()
         if search_mode == 1:  # API case
+            from arxivanalysis.arxiv import query
+
             self.url, self.contents = query(
                 search_query=search_query,
                 id_list=id_list,
@@ -52,30 +56,49 @@ class Paperls:
                 sort_by=sort_by,
                 sort_order=sort_order,
             )
-            idextract = re.compile(".*/([0-9.]*)")
             for c in self.contents:
-                c["title"] = re.subn(r"\n|  ", " ", c.get("title", ""))[0]
-                c["title"] = re.subn(r"  ", " ", c.get("title", ""))[0]
-                c["summary"] = re.subn(r"\n|  ", " ", c.get("summary", ""))[0]
-                c["summary"] = re.subn(r"  ", " ", c.get("summary", ""))[0]
-                c["arxiv_id"] = idextract.match(c["arxiv_url"]).group(1)
-                c["subject_abbr"] = [
-                    d["term"] for d in c["tags"] if d["term"] in category
-                ]
-                c["subject"] = [
-                    category.get(d, "") + " (%s)" % d for d in c["subject_abbr"]
-                ]
-                c["announce_date"] = announce_date_converter(c["published_parsed"])
+                normalize_query_result(c)
+            self._author_index.update(self.contents)
         elif search_mode == 2:  # new submission fetch
             self.url = "https://arxiv.org/list/" + search_query + "/new"
             samedate = False
             if sort_by == "submittedDate":
                 samedate = True
-            self.contents = new_submission(self.url, mode=start, samedate=samedate)
+            self.contents = new_submission(
+                self.url, mode=start, samedate=samedate, index=self._author_index
+            )
 
         self.count = 0
         self.search_query = search_query
+        metrics.count(items=len(self.contents))
 
+    @classmethod
+    def from_contents(cls, contents, search_query=""):
+        """
+        build paper list from existing content dicts without fetching anything
+
+        :param contents: list of dict, in the shape of ``Paperls.contents``
+        :param search_query: string, recorded as the search_query of the list
+        :return: Paperls
+        """
+        obj = cls.__new__(cls)
+        obj.url = None
+        obj.contents = list(contents)
+        obj.count = 0
+        obj.search_query = search_query
+        obj._author_index = None
+        return obj
+
+    @property
+    def author_index(self):
+        """
+        AuthorIndex of the papers, built on first use for lists made by ``from_contents``
+        """
+        if self._author_index is None:
+            self._author_index = AuthorIndex(self.contents)
+        return self._author_index
+
+    @metrics.instrument("paperls.merge")
     def merge(self, paperlsobj):
         """
         merge other paper list
@@ -83,43 +106,40 @@ class Paperls:
         :param paperlsobj:
         :return:
         """
-        idlist = [c["arxiv_id"] for c in self.contents]
+        idlist = set(c["arxiv_id"] for c in self.contents)
         for c in paperlsobj.contents:
             if c["arxiv_id"] not in idlist:
+                idlist.add(c["arxiv_id"])
                 self.contents.append(c)
+                if self._author_index is not None:
+                    self._author_index.add(c)
+        metrics.count(items=len(paperlsobj.contents))
 
-    def interest_match(self, choices):
+    @metrics.instrument("paperls.interest_match")
+    def interest_match(self, choices, authors=None):
+        """
+        :param choices: dict, keyword: weight, or ``matcher.Matcher``
+        :param authors: dict, followed author name: weight, or list of names,
+                        papers by them are looked up in the author index instead of fuzzy matched
+        """
         contents = self.contents
         for content in contents:
-            content["keyword"] = keyword_match(
-                content["title"]
-                + ". "
-                + content["title"]
-                + ". "
-                + ",".join(content["authors"])
-                + ". "
-                + content["summary"],
-                choices,
-            )
-            content["weight"] = sum([choices[kw[0]] for kw in content["keyword"]])
+            match_content(content, choices)
+        if authors:
+            author_match(contents, self.author_index.follow(authors), authors)
+        metrics.count(items=len(contents))
 
+    @metrics.instrument("paperls.tagging")
     def tagging(self, stoplistpath="SmartStopList.txt"):
-        rake = Rake(stoplistpath)
+        rake = get_rake(stoplistpath)
         for content in self.contents:
-            content["tags"] = deduplicate_tags(
-                select_tags(
-                    rake.run(
-                        content["title"]
-                        + ". "
-                        + content["summary"]
-                        + " "
-                        + content["title"]
-                    )
-                )
-            )
+            tag_content(content, rake)
+        metrics.count(items=len(self.contents))
 
+    @metrics.instrument("paperls.show_relevant")
     def show_relevant(self, purify=False):
         contents = self.contents
+        metrics.count(items=len(contents))
         if not purify:
             return sorted(
                 [c for c in contents if c.get("keyword", None)],
@@ -127,38 +147,72 @@ class Paperls:
                 reverse=True,
             )
         else:
-            pcontents = []
-            for c in contents:
-                if c.get("keyword", None):
-                    pcontent = {}
-                    pcontent["arxiv_id"] = c.get("arxiv_id", None)
-                    pcontent["arxiv_url"] = c.get("arxiv_url", None)
-                    pcontent["title"] = c.get("title", None)
-                    pcontent["authors"] = c.get("authors", None)
-                    pcontent["subject"] = c.get("subject", None)
-                    pcontent["subject_abbr"] = c.get("subject_abbr", None)
-                    pcontent["summary"] = c.get("summary", None)
-                    pcontent["keyword"] = c.get("keyword", None)
-                    pcontent["weight"] = c.get("weight", None)
-                    pcontent["tags"] = select_tags(
-                        c.get("tags", None), max_num=5, threhold=7.9
-                    )
-                    pcontent["announce_date"] = c.get("announce_date", None)
-                    pcontents.append(pcontent)
+            pcontents = [purify_content(c) for c in contents if c.get("keyword", None)]
             return sorted(pcontents, key=lambda s: s["weight"], reverse=True)
 
-    def mail(
+    def digest(
         self,
-        maildict,
         headline="Below is the summary of highlights on arXiv based on your interests",
     ):
+        """
+        render the html report of relevant papers
+
+        :param headline: string, the headline of the report
+        :return: string, html text, None if no paper is relevant
+        """
+        from arxivanalysis.notification import makemailcontent
+
         rs = self.show_relevant(purify=True)
+        metrics.count(items=len(rs))
         if rs:
-            maildict["content"] = makemailcontent(headline, rs)
+            return makemailcontent(headline, rs)
+
+    @metrics.instrument("paperls.mail")
+    def mail(
+        self,
+        maildict,
+        headline="Below is the summary of highlights on arXiv based on your interests",
+    ):
+        """
+        send the report of relevant papers, nothing is sent if no paper is relevant
+
+        :param maildict: dict, the arguments of ``notification.sendmail`` except title and content
+        :param headline: string, the headline of the report
+        :return: list of strings, arxiv ids of papers in the sent mail
+        """
+        from arxivanalysis.notification import sendmail
+
+        content = self.digest(headline)
+        if content:
+            maildict["content"] = content
             maildict["title"] = "Report on highlight of arXiv"
             ret = sendmail(**maildict)
             if not ret:
                 raise arxivException("mail sending failed")
+            return [c["arxiv_id"] for c in self.show_relevant()]
+        return []
+
+    def drop_sent(self, ledger, user):
+        """
+        drop papers already delivered to user, call it before interest_match to skip them
+
+        :param ledger: arxivanalysis.ledger.SentLedger
+        :param user: string, the key of the user in the ledger
+        """
+        before = len(self.contents)
+        self.contents = ledger.unsent(user, self.contents)
+        metrics.count(items=before - len(self.contents))
+
+    def download(self, dirname="./", **kws):
+        """
+        download pdfs of all papers in the list concurrently, see ``arxiv.download_all`` for options
+
+        :param dirname: string, the directory to save pdfs, with trailing slash
+        :return: dict, the download statistics
+        """
+        from arxivanalysis.arxiv import download_all
+
+        return download_all(self.contents, dirname=dirname, **kws)
 
     def __iter__(self):
         return self
@@ -172,7 +226,116 @@ class Paperls:
             return self.contents[self.count - 1]
 
 
+def match_text(content):
+    # the text fuzzy matched against keywords, title is counted twice on purpose
+    return (
+        content["title"]
+        + ". "
+        + content["title"]
+        + ". "
+        + ",".join(content["authors"])
+        + ". "
+        + content["summary"]
+    )
+
+
+def match_content(content, choices):
+    """
+    match one paper against keywords in place, setting its "keyword" and "weight"
+
+    :param content: dict, one paper in the shape of ``Paperls.contents``
+    :param choices: dict, keyword: weight, or ``matcher.Matcher``
+    :return: dict, the same paper
+    """
+    if hasattr(choices, "match"):
+        return choices.match(content)
+    content["keyword"] = keyword_match(match_text(content), choices)
+    content["weight"] = sum([choices[kw[0]] for kw in content["keyword"]])
+    return content
+
+
+_rakes = {}
+
+
+def get_rake(stoplistpath="SmartStopList.txt"):
+    """
+    :param stoplistpath: string, the path of stop word list
+    :return: Rake, built once per path, since compiling the stop word regex dominates small runs
+    """
+    if stoplistpath not in _rakes:
+        _rakes[stoplistpath] = Rake(stoplistpath)
+    return _rakes[stoplistpath]
+
+
+def author_match(contents, hits, authors):
+    """
+    add followed authors to "keyword" and "weight" of their papers, after keyword match
+
+    :param contents: list of content dicts
+    :param hits: dict, arxiv_id: list of followed names, see ``AuthorIndex.follow``
+    :param authors: dict, followed author name: weight, or list of names
+    :return: int, the number of papers by followed authors
+    """
+    authors = kw_lst2dict(authors)
+    n = 0
+    for content in contents:
+        names = hits.get(content["arxiv_id"])
+        if not names:
+            continue
+        n += 1
+        content.setdefault("keyword", [])
+        content.setdefault("weight", 0)
+        matched = set(kw[0] for kw in content["keyword"])
+        for name in names:
+            # a name already matched as a keyword is not counted twice
+            if name not in matched:
+                matched.add(name)
+                content["keyword"].append((name, 100, 100))
+                content["weight"] += authors[name]
+    return n
+
+
+def tag_text(content):
+    return content["title"] + ". " + content["summary"] + " " + content["title"]
+
+
+def tag_content(content, rake):
+    """
+    extract tags of one paper in place by RAKE
+
+    :param content: dict, one paper in the shape of ``Paperls.contents``
+    :param rake: Rake
+    :return: dict, the same paper
+    """
+    content["tags"] = deduplicate_tags(select_tags(rake.run(tag_text(content))))
+    return content
+
+
+def purify_content(c):
+    """
+    copy of one matched paper with only the fields needed for the report
+
+    :param c: dict, one paper after keyword match
+    :return: dict
+    """
+    pcontent = {}
+    pcontent["arxiv_id"] = c.get("arxiv_id", None)
+    pcontent["arxiv_url"] = c.get("arxiv_url", None)
+    pcontent["title"] = c.get("title", None)
+    pcontent["authors"] = c.get("authors", None)
+    pcontent["subject"] = c.get("subject", None)
+    pcontent["subject_abbr"] = c.get("subject_abbr", None)
+    pcontent["summary"] = c.get("summary", None)
+    pcontent["keyword"] = c.get("keyword", None)
+    pcontent["weight"] = c.get("weight", None)
+    pcontent["tags"] = select_tags(c.get("tags", None), max_num=5, threhold=7.9)
+    pcontent["announce_date"] = c.get("announce_date", None)
+    return pcontent
+
+
 def keyword_match(text, kwlist, threhold=(90, 80)):
+    from fuzzywuzzy import fuzz
+
     r = []
     for kw in kwlist:
         tsr_score = fuzz.token_set_ratio(kw, text)
@@ -183,17 +346,114 @@ def keyword_match(text, kwlist, threhold=(90, 80)):
     return r
 
 
-def new_submission(url, mode=1, samedate=False):
+_idextract = re.compile(r".*/abs/(.+?)(?:v\d+)?$")
+
+
+def normalize_query_result(c):
+    """
+    normalize one result of arxiv API query in place to the content dict shape of Paperls
+
+    :param c: dict, one entry from ``arxiv.query``
+    :return: dict, the same entry
+    """
+    c["title"] = re.subn(r"\n|  ", " ", c.get("title", ""))[0]
+    c["title"] = re.subn(r"  ", " ", c.get("title", ""))[0]
+    c["summary"] = re.subn(r"\n|  ", " ", c.get("summary", ""))[0]
+    c["summary"] = re.subn(r"  ", " ", c.get("summary", ""))[0]
+    c["arxiv_id"] = _idextract.match(c["arxiv_url"]).group(1)
+    c["subject_abbr"] = [d["term"] for d in c["tags"] if d["term"] in category]
+    c["subject"] = [category.get(d, "") + " (%s)" % d for d in c["subject_abbr"]]
+    c["announce_date"] = announce_date_converter(c["published_parsed"])
+    return c
+
+
+# fields of query results kept by lookup, the same as those of harvested records
+lookup_fields = (
+    "arxiv_id",
+    "arxiv_url",
+    "title",
+    "summary",
+    "authors",
+    "subject",
+    "subject_abbr",
+    "announce_date",
+    "arxiv_comment",
+    "journal_reference",
+    "doi",
+)
+
+
+@metrics.instrument("paperls.lookup")
+def lookup(id_list, store=None, **kws):
+    """
+    bulk metadata lookup by arxiv id, papers in the store are not fetched again
+
+    :param id_list: iterable of strings, arxiv ids in any form accepted by ``arxiv.canonical_id``
+    :param store: arxivanalysis.store.Store, checked first and updated with fetched papers
+    :param kws: options of ``arxiv.query_ids``, eg. max_workers and rate
+    :return: tuple of dict, arxiv_id without version: content dict,
+            and list of the ids which are invalid or do not exist
+    """
+    from arxivanalysis.arxiv import canonical_id, query_ids
+
+    wanted = {}
+    missing = []
+    for i in id_list:
+        cid = canonical_id(i)
+        if cid is None:
+            missing.append(i)
+        else:
+            wanted[cid] = True
+    found = store.get_many(wanted) if store is not None else {}
+    metrics.count(items=len(found))
+    for entries, absent in query_ids([i for i in wanted if i not in found], **kws):
+        contents = []
+        for cid, entry in entries.items():
+            c = normalize_query_result(entry)
+            c["arxiv_id"] = cid
+            contents.append({k: c.get(k) for k in lookup_fields})
+        if store is not None:
+            store.insert_many(contents)
+        found.update((c["arxiv_id"], c) for c in contents)
+        missing.extend(absent)
+    return found, missing
+
+
+@metrics.instrument("new_submission")
+def new_submission(url, mode=1, samedate=False, index=None):
     """
     fetching new submission everyday
 
     :param url: string, the url for the new page of certain category
     :param mode: int, 0 for new, 1 for cross, 2 for both
     :param samedate: boolean, if true, there is a check to make sure the submission is for today
+    :param index: AuthorIndex, updated with the authors of the papers
     :return: list of dict, containing all papers
     """
-    pa = requests.get(url)
-    so = BeautifulSoup(pa.text, "lxml")
+    from arxivanalysis.arxiv import fetch
+
+    status, data = fetch(url)
+    if status != 200:
+        raise arxivException("HTTP Error %s for %s" % (status or "no status", url))
+    contents = parse_submission(data.decode("utf-8"), mode=mode, samedate=samedate)
+    if index is not None:
+        index.update(contents)
+    metrics.count(items=len(contents), nbytes=len(data))
+    return contents
+
+
+def parse_submission(html, mode=1, samedate=False):
+    """
+    parsing the html of new submission page
+
+    :param html: string, the html text of the new page of certain category
+    :param mode: int, 0 for new, 1 for cross, 2 for both
+    :param samedate: boolean, if true, there is a check to make sure the submission is for today
+    :return: list of dict, containing all papers
+    """
+    from bs4 import BeautifulSoup
+
+    so = BeautifulSoup(html, "lxml")
     if samedate is True:
         date_filter = re.compile(r"^Showing new listings for ([a-zA-Z]+), .*")
         try:
@@ -308,6 +568,8 @@ def select_tags(kw_rank, max_num=10, threhold=3.9):
 
 
 def deduplicate_tags(kw_rank, threhold=65):
+    from fuzzywuzzy import fuzz
+
     len_kw = len(kw_rank)
     mask = [True for _ in range(len_kw)]
     for i in range(len_kw):
@@ -0,0 +1,335 @@
+"""
+streaming pipeline over papers: fetch -> parse -> normalize -> tag -> match -> select
+
+Each stage is a generator taking the iterable of the previous stage, so papers flow one
+by one and memory stays bounded by the buffers between stages instead of the size of the
+harvest, eg.::
+
+    papers = (
+        Pipeline(fetch_listing(["cond-mat", "quant-ph"]))
+        .pipe(parse, mode=2)
+        .pipe(normalize)
+        .pipe(tag, stoplistpath, workers=4)
+        .pipe(match, {"topological": 2, "entanglement": 1})
+        .pipe(select, top=20, purify=True)
+    )
+    for paper in papers:
+        ...
+"""
+
+import time
+import queue
+import heapq
+import threading
+from collections import deque
+from arxivanalysis.paperls import (
+    Paperls,
+    arxivException,
+    parse_submission,
+    normalize_query_result,
+    match_content,
+    tag_content,
+    tag_text,
+    get_rake,
+    purify_content,
+    select_tags,
+    deduplicate_tags,
+)
+from arxivanalysis import metrics
+
+_done = object()
+
+
+def buffered(iterable, size=64):
+    """
+    run iterable in a background thread, handing items over through a queue of at most size items
+
+    :param iterable: iterable, usually the generator of the previous stage
+    :param size: int, the max number of items buffered
+    :return: generator
+    """
+    q = queue.Queue(maxsize=size)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_done, None))
+        except BaseException as e:
+            put((_done, e))
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item, error = q.get()
+            if item is _done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def bounded_map(func, iterable, workers=4, window=None, executor="process", **kws):
+    """
+    ordered parallel map keeping at most window items in flight
+
+    :param func: callable, must be picklable for the process executor
+    :param iterable: iterable
+    :param workers: int, the number of workers
+    :param window: int, the max number of submitted but not yet yielded items, default to 4*workers
+    :param executor: string, "process" or "thread"
+    :param kws: passed to the executor, eg. initializer and initargs,
+                worker processes are started by forkserver or spawn unless mp_context is given
+    :return: generator of func(item)
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    window = window or 4 * workers
+    pool = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    if executor == "process" and "mp_context" not in kws:
+        import multiprocessing
+
+        # the stages run in threads, forking a threaded process may deadlock the child
+        methods = multiprocessing.get_all_start_methods()
+        method = "forkserver" if "forkserver" in methods else "spawn"
+        kws["mp_context"] = multiprocessing.get_context(method)
+    with pool(max_workers=workers, **kws) as ex:
+        pending = deque()
+        for item in iterable:
+            pending.append(ex.submit(func, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def fetch_listing(categories):
+    """
+    fetch stage for the new submission pages, pages of any day are passed on,
+    use ``parse(samedate=True)`` to keep only today's
+
+    :param categories: list of strings, eg. ["cond-mat", "quant-ph"]
+    :return: generator of ("list", html text)
+    """
+    from arxivanalysis.arxiv import fetch
+
+    for cat in categories:
+        url = "https://arxiv.org/list/" + cat + "/new"
+        with metrics.stage("pipeline.fetch"):
+            status, data = fetch(url)
+            if status != 200:
+                raise arxivException(
+                    "HTTP Error %s for %s" % (status or "no status", url)
+                )
+            metrics.count(items=1, nbytes=len(data))
+        yield "list", data.decode("utf-8")
+
+
+def fetch_query(
+    search_query="",
+    id_list=[],
+    page_size=100,
+    max_results=None,
+    sort_by="submittedDate",
+    sort_order="descending",
+    delay=3.0,
+):
+    """
+    fetch stage for the arxiv API, paging through results until they are exhausted
+
+    :param search_query: string, see arxiv api doc, eg. with a submittedDate range for backfill
+    :param id_list: list of strings of arxiv id
+    :param page_size: int, the number of results per request
+    :param max_results: int, stop after this many results, None for no limit
+    :param sort_by: string, see arxiv api doc
+    :param sort_order: string, see arxiv api doc
+    :param delay: float, seconds to wait between requests as asked by arxiv
+    :return: generator of ("feed", xml bytes)
+    """
+    from arxivanalysis.arxiv import query_url, fetch_query as fetch_page
+
+    start = 0
+    while max_results is None or start < max_results:
+        n = page_size if max_results is None else min(page_size, max_results - start)
+        url = query_url(search_query, id_list, start, n, sort_by, sort_order)
+        with metrics.stage("pipeline.fetch"):
+            data = fetch_page(url)
+            metrics.count(items=1, nbytes=len(data))
+        # an empty page has no <entry>, no need to parse it to find the end
+        if b"<entry>" not in data:
+            return
+        yield "feed", data
+        start += n
+        if delay:
+            time.sleep(delay)
+
+
+def parse(pages, mode=1, samedate=False):
+    """
+    parse stage, one page in memory at a time
+
+    :param pages: iterable of (kind, data) from the fetch stages
+    :param mode: int, for listing pages, 0 for new, 1 for cross, 2 for both
+    :param samedate: boolean, for listing pages, see ``new_submission``
+    :return: generator of dict, listing entries or raw API entries
+    """
+    for kind, data in pages:
+        if kind == "list":
+            entries = parse_submission(data, mode=mode, samedate=samedate)
+        else:
+            import feedparser
+            from arxivanalysis.arxiv import parse_entries
+
+            entries = parse_entries(feedparser.parse(data)["entries"])
+        for entry in entries:
+            yield entry
+
+
+def normalize(papers, dedup=True):
+    """
+    normalize stage, bringing API entries to the content dict shape of Paperls
+
+    :param papers: iterable of dict
+    :param dedup: boolean, if true, papers already seen are dropped
+    :return: generator of dict
+    """
+    seen = set()
+    for c in papers:
+        if "arxiv_id" not in c:
+            normalize_query_result(c)
+        if dedup:
+            if c["arxiv_id"] in seen:
+                continue
+            seen.add(c["arxiv_id"])
+        yield c
+
+
+_rake = None
+
+
+def _init_tagger(stoplistpath):
+    global _rake
+    _rake = get_rake(stoplistpath)
+
+
+def _tag_text(text):
+    return deduplicate_tags(select_tags(_rake.run(text)))
+
+
+def tag(papers, stoplistpath="SmartStopList.txt", workers=0, window=None):
+    """
+    tag stage by RAKE
+
+    :param papers: iterable of dict
+    :param stoplistpath: string, the path of stop word list
+    :param workers: int, the number of worker processes, 0 for tagging in the current thread,
+                    the workers import the main module, which needs a ``__main__`` guard
+    :param window: int, the max number of papers in flight for parallel tagging
+    :return: generator of dict, in the input order
+    """
+    if not workers:
+        rake = get_rake(stoplistpath)
+        for c in papers:
+            yield tag_content(c, rake)
+        return
+    # only the text is shipped to workers, the paper itself waits in the window
+    pending = deque()
+
+    def texts():
+        for c in papers:
+            pending.append(c)
+            yield tag_text(c)
+
+    for tags in bounded_map(
+        _tag_text,
+        texts(),
+        workers=workers,
+        window=window,
+        initializer=_init_tagger,
+        initargs=(stoplistpath,),
+    ):
+        c = pending.popleft()
+        c["tags"] = tags
+        yield c
+
+
+def match(papers, choices):
+    """
+    match stage
+
+    :param papers: iterable of dict
+    :param choices: dict, keyword: weight
+    :return: generator of dict, with "keyword" and "weight" set
+    """
+    for c in papers:
+        yield match_content(c, choices)
+
+
+def select(papers, top=None, purify=False):
+    """
+    select stage, keeping only papers matching some keyword, highest weight first
+
+    :param papers: iterable of dict, after the match stage
+    :param top: int, keep only the top papers, which bounds the memory by a heap of this size
+    :param purify: boolean, the same as in ``Paperls.show_relevant``
+    :return: generator of dict
+    """
+    relevant = (c for c in papers if c.get("keyword", None))
+    if purify:
+        relevant = (purify_content(c) for c in relevant)
+    if top is None:
+        selected = sorted(relevant, key=lambda s: s["weight"], reverse=True)
+    else:
+        selected = heapq.nlargest(top, relevant, key=lambda s: s["weight"])
+    for c in selected:
+        yield c
+
+
+class Pipeline:
+    """
+    composition of stages with bounded buffers in between
+
+    :param source: iterable, the output of the first stage
+    :param buffer: int, the max number of items buffered between two stages,
+                    0 to chain the generators in the current thread
+    """
+
+    def __init__(self, source, buffer=64):
+        self.source = source
+        self.buffer = buffer
+        self.stages = []
+
+    def pipe(self, stage, *args, **kws):
+        """
+        append a stage
+
+        :param stage: callable, stage(iterable, *args, **kws) returning an iterable
+        :return: Pipeline, self for chaining
+        """
+        self.stages.append((stage, args, kws))
+        return self
+
+    def __iter__(self):
+        it = iter(self.source)
+        for stage, args, kws in self.stages:
+            if self.buffer:
+                it = buffered(it, self.buffer)
+            it = stage(it, *args, **kws)
+        return iter(it)
+
+    def to_paperls(self, search_query=""):
+        return Paperls.from_contents(self, search_query)
@@ -0,0 +1,324 @@
+"""
+long running service keeping the tagged listings, RAKE and compiled matchers warm in memory
+
+It answers previews over a local HTTP or unix socket API, eg.::
+
+    POST /match   {"choices": {"topological": 2}, "subjects": ["cond-mat"], "top": 10}
+    POST /digest  {"choices": ["entanglement"], "authors": ["J. Dupont"], "subjects": ["quant-ph"]}
+    GET  /status
+
+/match returns the relevant papers as json, /digest the html report (204 if nothing matches).
+Listings are refreshed in a background thread, and only parsed and tagged again when
+the announcement heading of the new page changes.
+"""
+
+import os
+import re
+import json
+import time
+import socket
+import threading
+from arxivanalysis.paperls import (
+    Paperls,
+    parse_submission,
+    get_rake,
+    tag_content,
+    author_match,
+)
+from arxivanalysis.matcher import MatcherCache
+from arxivanalysis.authors import follow_all
+from arxivanalysis.cons import category, field
+from arxivanalysis import metrics
+
+try:
+    # Python 2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn, UnixStreamServer
+except ImportError:
+    # Python 3
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn, UnixStreamServer
+
+_heading = re.compile(r"Showing new listings for ([^<]*)")
+# the listing of an archive or of one of its categories, CoRR is listed as cs
+known_subjects = set(category) | set(field) | {"cs"}
+
+
+class ServiceError(Exception):
+    pass
+
+
+class Service:
+    """
+    warm state shared by all requests
+
+    :param subjects: list of strings, categories loaded at start, eg. ["cond-mat", "quant-ph"]
+    :param stoplistpath: string, the path of stop word list
+    :param mode: int, 0 for new, 1 for cross, 2 for both
+    :param matchers: MatcherCache, default to an in-memory one keeping 256 matchers,
+                    it should be bounded as every keyword set of a client adds one
+    :param list_url: string, the listing url with %s for the category
+    """
+
+    def __init__(
+        self,
+        subjects=(),
+        stoplistpath="SmartStopList.txt",
+        mode=0,
+        matchers=None,
+        list_url="https://arxiv.org/list/%s/new",
+    ):
+        self.stoplistpath = stoplistpath
+        self.mode = mode
+        self.matchers = (
+            matchers if matchers is not None else MatcherCache(max_matchers=256)
+        )
+        self.list_url = list_url
+        self.corpus = {}
+        self.state = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        get_rake(stoplistpath)
+        for sub in subjects:
+            self.refresh(sub)
+
+    @metrics.instrument("service.refresh")
+    def refresh(self, sub):
+        """
+        fetch the listing of sub, it is parsed and tagged only if a new announcement is out
+
+        :param sub: string, the category
+        :return: bool, whether the corpus of sub is replaced
+        """
+        from arxivanalysis.arxiv import fetch
+
+        status, data = fetch(self.list_url % sub)
+        if status != 200:
+            raise ServiceError("HTTP Error %s for the listing of %s" % (status, sub))
+        text = data.decode("utf-8")
+        m = _heading.search(text)
+        heading = m.group(1).strip() if m else None
+        if sub in self.corpus and heading == self.state[sub]["announcement"]:
+            self.state[sub]["checked"] = time.time()
+            return False
+        contents = parse_submission(text, mode=self.mode)
+        rake = get_rake(self.stoplistpath)
+        for c in contents:
+            tag_content(c, rake)
+        metrics.count(items=len(contents), nbytes=len(data))
+        pl = Paperls.from_contents(contents, sub)
+        pl.url = self.list_url % sub
+        # built before publishing, requests only read it
+        pl.author_index
+        now = time.time()
+        # papers are never mutated once published here, requests match on copies
+        with self._lock:
+            self.corpus[sub] = pl
+            self.state[sub] = {
+                "announcement": heading,
+                "papers": len(contents),
+                "updated": now,
+                "checked": now,
+            }
+        return True
+
+    def _corpus(self, subjects):
+        unknown = [sub for sub in subjects if sub not in known_subjects]
+        if unknown:
+            # a listing fetched on demand is also refreshed for good
+            raise ServiceError("unknown subjects %s" % ", ".join(unknown))
+        with self._lock:
+            missing = [sub for sub in subjects if sub not in self.corpus]
+        for sub in missing:
+            self.refresh(sub)
+        with self._lock:
+            return [self.corpus[sub] for sub in subjects]
+
+    def papers(self, subjects):
+        """
+        :param subjects: list of strings
+        :return: Paperls, merged copies of the papers of subjects, safe to match in place
+        """
+        return self._copy(self._corpus(subjects))
+
+    def _copy(self, corpus):
+        lst = Paperls.from_contents([])
+        for pl in corpus:
+            lst.merge(Paperls.from_contents([dict(c) for c in pl.contents]))
+        return lst
+
+    def _match(self, choices, subjects, authors=None):
+        if isinstance(choices, str):
+            # MatcherCache would read it as the path of a keyword file on this host
+            raise ServiceError("choices must be a dict or a list of keywords")
+        corpus = self._corpus(subjects)
+        lst = self._copy(corpus)
+        lst.interest_match(self.matchers.get(choices))
+        if authors:
+            # resolved in the warm index of each subject instead of indexing the copies
+            hits = follow_all([pl.author_index for pl in corpus], authors)
+            author_match(lst.contents, hits, authors)
+        return lst
+
+    @metrics.instrument("service.match")
+    def match(self, choices, subjects, top=None, authors=None):
+        """
+        :param choices: dict of keyword: weight or list of keywords,
+                        never a path from an untrusted client, see ``MatcherCache.get``
+        :param subjects: list of strings
+        :param top: int, the max number of papers returned, None for all
+        :param authors: dict or list, followed authors, see ``Paperls.interest_match``
+        :return: list of dict, relevant papers purified for the report, by weight
+        """
+        rs = self._match(choices, subjects, authors).show_relevant(purify=True)
+        return rs[:top] if top else rs
+
+    @metrics.instrument("service.digest")
+    def digest(self, choices, subjects, headline=None, authors=None):
+        """
+        :return: string, html report, None if no paper is relevant
+        """
+        lst = self._match(choices, subjects, authors)
+        if headline:
+            return lst.digest(headline)
+        return lst.digest()
+
+    def status(self):
+        with self._lock:
+            return {sub: dict(st) for sub, st in self.state.items()}
+
+    def start(self, interval=600):
+        """
+        refresh all loaded subjects every interval seconds in a background thread
+
+        :param interval: float, seconds
+        """
+
+        def loop():
+            while not self._stop.wait(interval):
+                for sub in list(self.corpus):
+                    try:
+                        self.refresh(sub)
+                    except Exception as e:
+                        print("failed to refresh %s: %s" % (sub, e))
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name="arxiv-refresh")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class Handler(BaseHTTPRequestHandler):
+    service = None
+
+    def _send(self, code, body=b"", ctype="application/json"):
+        self.send_response(code)
+        self.send_header("Content-Type", ctype + "; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, code, obj):
+        self._send(code, json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+    def do_GET(self):
+        if self.path == "/status":
+            return self._json(200, self.service.status())
+        self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            req = json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+            if not isinstance(req, dict):
+                raise ValueError("the request must be a json object")
+            authors = _keywords(req.get("authors"), "authors")
+            if "choices" in req or not authors:
+                choices = _keywords(req.get("choices"), "choices")
+            else:
+                choices = {}
+            subjects = req.get("subjects")
+            if isinstance(subjects, str):
+                subjects = [subjects]
+            if not isinstance(subjects, list) or not all(
+                isinstance(sub, str) for sub in subjects
+            ):
+                raise ValueError("subjects must be a string or a list of strings")
+            unknown = [sub for sub in subjects if sub not in known_subjects]
+            if unknown:
+                raise ValueError("unknown subjects %s" % ", ".join(unknown))
+            top = req.get("top")
+            if top is not None and (
+                not isinstance(top, int) or isinstance(top, bool) or top < 0
+            ):
+                raise ValueError("top must be a non-negative integer")
+            headline = req.get("headline")
+            if headline is not None and not isinstance(headline, str):
+                raise ValueError("headline must be a string")
+        except ValueError as e:
+            return self._json(400, {"error": "bad request: %s" % e})
+        try:
+            if self.path == "/match":
+                papers = self.service.match(choices, subjects, top, authors)
+                return self._json(200, {"papers": papers})
+            if self.path == "/digest":
+                html = self.service.digest(choices, subjects, headline, authors)
+                if html is None:
+                    return self._send(204)
+                return self._send(200, html.encode("utf-8"), "text/html")
+        except Exception as e:
+            return self._json(502, {"error": str(e)})
+        self._json(404, {"error": "not found"})
+
+    def address_string(self):
+        # unix socket peers have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+
+def _keywords(value, name):
+    # only inline keywords are accepted from clients, a string would be read as a local file
+    if isinstance(value, list) and all(isinstance(kw, str) for kw in value):
+        return value
+    if isinstance(value, dict) and all(
+        isinstance(w, (int, float)) and not isinstance(w, bool) for w in value.values()
+    ):
+        return value
+    if value is None and name == "authors":
+        return None
+    raise ValueError("%s must be a list of strings or a dict of string: number" % name)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        UnixStreamServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def make_server(service, address):
+    """
+    :param service: Service
+    :param address: tuple of (host, port), or string of the path of a unix socket
+    :return: server, call ``serve_forever`` on it
+    """
+    handler = type("ServiceHandler", (Handler,), {"service": service})
+    if isinstance(address, str):
+        if not hasattr(socket, "AF_UNIX"):
+            raise ServiceError("unix sockets are not supported on this platform")
+        return ThreadingUnixHTTPServer(address, handler)
+    return ThreadingHTTPServer(address, handler)
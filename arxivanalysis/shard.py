@@ -0,0 +1,107 @@
+"""
+run per-item work split across worker processes, with results spooled to disk
+"""
+
+import os
+import json
+import tempfile
+import multiprocessing
+from arxivanalysis import metrics
+
+
+def split(items, n):
+    """
+    split items into n shards round robin, so that heavy and light items spread evenly
+
+    :param items: list
+    :param n: int, the number of shards
+    :return: list of lists, empty shards are dropped
+    """
+    return [s for s in (items[i::n] for i in range(n)) if s]
+
+
+def _spool_path(spool_dir, i):
+    return os.path.join(spool_dir, "shard-%s.jsonl" % i)
+
+
+def _metrics_path(spool_dir, i):
+    return os.path.join(spool_dir, "shard-%s.metrics.json" % i)
+
+
+def _run_shard(func, i, shard, spool_dir, context):
+    # a forked shard inherits the recorder with the events of the parent so far
+    recorder = metrics.get_recorder()
+    start = len(recorder.events) if recorder is not None else 0
+    # one json line per item, flushed as soon as the item is done,
+    # so even a crash in the middle of the shard keeps the finished items
+    with open(_spool_path(spool_dir, i), "w") as f:
+        for item in shard:
+            try:
+                record = {"item": item, "result": func(item, context), "error": None}
+            except Exception as e:
+                record = {"item": item, "result": None, "error": repr(e)}
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+    if recorder is not None:
+        with open(_metrics_path(spool_dir, i), "w") as f:
+            json.dump(recorder.events[start:], f)
+
+
+def run_sharded(func, items, spool_dir, workers=None, context=None):
+    """
+    apply func(item, context) to all items in worker processes, one process per shard.
+
+    Results are collected from the spool files after all shards exit, so a shard dying
+    (even hard, eg. killed by the OOM killer) only loses its unfinished items. Each run
+    writes them in a fresh subdirectory of spool_dir, results of earlier runs are never read.
+    With the fork start method, context is shared copy-on-write instead of pickled, and
+    the stages recorded by the shards are added to the active ``metrics`` recorder,
+    except for shards killed before they finish.
+
+    :param func: callable, func(item, context) returning a json serializable result
+    :param items: list of json serializable items, eg. user dicts
+    :param spool_dir: string, the directory for the per shard result files of each run
+    :param workers: int, the number of shards, default to the number of cpus
+    :param context: object, eg. the tagged corpus shared by all items
+    :return: tuple of a list of dicts with "item", "result" and "error" for each finished item,
+            and a list of items not finished because their shard crashed
+    """
+    workers = workers or os.cpu_count() or 1
+    shards = split(list(items), workers)
+    os.makedirs(spool_dir, exist_ok=True)
+    spool_dir = tempfile.mkdtemp(prefix="run-", dir=spool_dir)
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+    procs = [
+        ctx.Process(target=_run_shard, args=(func, i, shard, spool_dir, context))
+        for i, shard in enumerate(shards)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+    recorder = metrics.get_recorder()
+    finished = []
+    lost = []
+    for i, shard in enumerate(shards):
+        if procs[i].exitcode != 0:
+            print("shard %s exited with code %s" % (i, procs[i].exitcode))
+        if recorder is not None and os.path.exists(_metrics_path(spool_dir, i)):
+            with open(_metrics_path(spool_dir, i)) as f:
+                try:
+                    recorder.extend(json.load(f))
+                except ValueError:  # a shard killed while writing them
+                    pass
+        done = []
+        path = _spool_path(spool_dir, i)
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        done.append(json.loads(line))
+                    except ValueError:  # truncated last line of a crashed shard
+                        break
+        finished.extend(done)
+        lost.extend(shard[len(done) :])
+    return finished, lost
@@ -0,0 +1,276 @@
+"""
+compact read-only snapshot of a tagged paper list, memory-mapped for zero-copy sharing
+
+Layout, all integers in native byte order (recorded in the header)::
+
+    header      magic, version, byteorder, counts and section offsets
+    str_offsets uint64[n_strings + 1], utf-8 string i is str_data[off[i]:off[i+1]]
+    str_data    bytes
+    papers      uint32[n_papers, 13], string ids of the scalar fields, then
+                (start, count) into refs for each list field and into tags,
+                a count of 0xFFFFFFFF for a paper never tagged
+    refs        uint32[n_refs], string ids of list field items
+    tag_ids     uint32[n_tags], string ids of tag phrases
+    tag_scores  float64[n_tags], RAKE scores of tags
+
+Only the fields below are kept, per user fields like "keyword" and "weight" are not.
+"""
+
+import os
+import sys
+import mmap
+import struct
+from array import array
+from collections.abc import MutableMapping
+from arxivanalysis.paperls import Paperls
+
+scalar_fields = ("arxiv_id", "arxiv_url", "title", "summary", "announce_date")
+list_fields = ("authors", "subject", "subject_abbr")
+
+_magic = b"AXSNAP"
+_version = 2
+# magic, version, byteorder, n_papers, n_strings, n_refs, n_tags, 6 section offsets
+_header = struct.Struct("<6sHB3xIIII6Q")
+_none = 0xFFFFFFFF
+_row = len(scalar_fields) + 2 * len(list_fields) + 2
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _align(f, n=8):
+    pad = -f.tell() % n
+    f.write(b"\0" * pad)
+    return f.tell()
+
+
+def write_snapshot(papers, path):
+    """
+    write papers as a snapshot file, atomically replacing path
+
+    :param papers: Paperls or list of content dicts, usually after tagging
+    :param path: string, the snapshot file
+    :return: string, path
+    """
+    contents = getattr(papers, "contents", papers)
+    strings = {}
+    offsets = array("Q", [0])
+    data = bytearray()
+
+    def intern(s):
+        if s is None:
+            return _none
+        if s not in strings:
+            strings[s] = len(strings)
+            data.extend(s.encode("utf-8"))
+            offsets.append(len(data))
+        return strings[s]
+
+    rows = array("I")
+    refs = array("I")
+    tag_ids = array("I")
+    tag_scores = array("d")
+    for c in contents:
+        for field in scalar_fields:
+            rows.append(intern(c.get(field)))
+        for field in list_fields:
+            items = c.get(field) or []
+            rows.extend([len(refs), len(items)])
+            refs.extend(intern(s) for s in items)
+        tags = c.get("tags")
+        # a paper never tagged reads back as None like in Paperls, not as no tags found
+        rows.extend([len(tag_ids), _none if tags is None else len(tags)])
+        for phrase, score in tags or ():
+            tag_ids.append(intern(phrase))
+            tag_scores.append(score)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(b"\0" * _header.size)
+        sections = []
+        for arr in (offsets, bytes(data), rows, refs, tag_ids, tag_scores):
+            sections.append(_align(f))
+            f.write(arr if isinstance(arr, bytes) else arr.tobytes())
+        f.seek(0)
+        f.write(
+            _header.pack(
+                _magic,
+                _version,
+                0 if sys.byteorder == "little" else 1,
+                len(contents),
+                len(strings),
+                len(refs),
+                len(tag_ids),
+                *sections
+            )
+        )
+    os.replace(tmp, path)
+    return path
+
+
+class Snapshot:
+    """
+    read-only view of a snapshot file, fields are decoded only when accessed
+
+    :param path: string, the snapshot file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._mm)
+        if len(buf) < _header.size:
+            raise SnapshotError("%s is not a snapshot" % path)
+        (
+            magic,
+            version,
+            byteorder,
+            self.n_papers,
+            n_strings,
+            n_refs,
+            n_tags,
+            *sections,
+        ) = _header.unpack_from(buf)
+        if magic != _magic or version != _version:
+            raise SnapshotError("%s is not a snapshot of version %s" % (path, _version))
+        if byteorder != (0 if sys.byteorder == "little" else 1):
+            raise SnapshotError("%s is written with another byte order" % path)
+        o_offsets, o_data, o_papers, o_refs, o_tag_ids, o_tag_scores = sections
+        self._offsets = buf[o_offsets : o_offsets + 8 * (n_strings + 1)].cast("Q")
+        self._data = buf[o_data:o_papers]
+        self._rows = buf[o_papers : o_papers + 4 * _row * self.n_papers].cast("I")
+        self._refs = buf[o_refs : o_refs + 4 * n_refs].cast("I")
+        self._tag_ids = buf[o_tag_ids : o_tag_ids + 4 * n_tags].cast("I")
+        self._tag_scores = buf[o_tag_scores : o_tag_scores + 8 * n_tags].cast("d")
+        self._index = None
+
+    def string(self, i):
+        if i == _none:
+            return None
+        return str(self._data[self._offsets[i] : self._offsets[i + 1]], "utf-8")
+
+    def field(self, row, name):
+        """
+        :param row: int, the index of the paper
+        :param name: string, one of scalar_fields, list_fields or "tags"
+        :return: the decoded value
+        """
+        base = row * _row
+        if name in scalar_fields:
+            return self.string(self._rows[base + scalar_fields.index(name)])
+        if name in list_fields:
+            pos = base + len(scalar_fields) + 2 * list_fields.index(name)
+            start, count = self._rows[pos], self._rows[pos + 1]
+            return [self.string(i) for i in self._refs[start : start + count]]
+        if name == "tags":
+            start, count = self._rows[base + _row - 2], self._rows[base + _row - 1]
+            if count == _none:
+                return None
+            return [
+                (self.string(self._tag_ids[i]), self._tag_scores[i])
+                for i in range(start, start + count)
+            ]
+        raise KeyError(name)
+
+    def find(self, arxiv_id):
+        """
+        :param arxiv_id: string
+        :return: SnapshotPaper or None
+        """
+        if self._index is None:
+            self._index = {
+                self.string(self._rows[r * _row]): r for r in range(self.n_papers)
+            }
+        row = self._index.get(arxiv_id)
+        return None if row is None else SnapshotPaper(self, row)
+
+    def __len__(self):
+        return self.n_papers
+
+    def __getitem__(self, row):
+        if not -self.n_papers <= row < self.n_papers:
+            raise IndexError(row)
+        return SnapshotPaper(self, row % self.n_papers)
+
+    def __iter__(self):
+        for row in range(self.n_papers):
+            yield SnapshotPaper(self, row)
+
+    def to_paperls(self, search_query=""):
+        """
+        :return: Paperls, whose contents are lazy views on this snapshot
+        """
+        return Paperls.from_contents(self, search_query)
+
+    def close(self):
+        for view in (
+            self._offsets,
+            self._data,
+            self._rows,
+            self._refs,
+            self._tag_ids,
+            self._tag_scores,
+        ):
+            view.release()
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SnapshotPaper(MutableMapping):
+    """
+    one paper of a snapshot, usable as the content dict of Paperls.
+
+    Stored fields are decoded from the map on access, fields set later
+    (eg. "keyword" and "weight" by interest_match) are kept in a private overlay.
+    """
+
+    _stored = scalar_fields + list_fields + ("tags",)
+
+    def __init__(self, snapshot, row):
+        self._snapshot = snapshot
+        self._row = row
+        self._overlay = {}
+
+    def __getitem__(self, key):
+        if key in self._overlay:
+            return self._overlay[key]
+        if key in self._stored:
+            return self._snapshot.field(self._row, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        self._overlay[key] = value
+
+    def __delitem__(self, key):
+        del self._overlay[key]
+
+    def __iter__(self):
+        for key in self._stored:
+            yield key
+        for key in self._overlay:
+            if key not in self._stored:
+                yield key
+
+    def __len__(self):
+        return len(set(self._stored) | set(self._overlay))
+
+    def __repr__(self):
+        return "<SnapshotPaper %s>" % self["arxiv_id"]
+
+
+def load(path, search_query=""):
+    """
+    open a snapshot as Paperls
+
+    :param path: string, the snapshot file
+    :param search_query: string, recorded as the search_query of the list
+    :return: Paperls
+    """
+    return Snapshot(path).to_paperls(search_query)
@@ -0,0 +1,134 @@
+"""
+local sqlite store of paper metadata, keyed by arxiv id
+"""
+
+import json
+import sqlite3
+from arxivanalysis.paperls import Paperls
+
+# fields of content dicts which are not paper metadata and are never stored
+transient_fields = ("keyword", "weight")
+
+
+class Store:
+    """
+    paper metadata store, each paper is kept as the json of its content dict
+
+    :param path: string, the sqlite database file, ":memory:" for a temporary store
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS papers (
+                arxiv_id TEXT PRIMARY KEY,
+                announce_date TEXT,
+                content TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS papers_date ON papers (announce_date);
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            """)
+
+    def _row(self, c):
+        c = {k: v for k, v in c.items() if k not in transient_fields}
+        return c["arxiv_id"], c.get("announce_date"), json.dumps(c)
+
+    def insert_many(self, contents, state=None):
+        """
+        insert or replace papers in one transaction
+
+        :param contents: iterable of content dicts, each with "arxiv_id"
+        :param state: dict, key: value saved in the same transaction, eg. a harvest checkpoint,
+                    a value of None deletes the key
+        :return: int, the number of papers written
+        """
+        rows = [self._row(c) for c in contents]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO papers (arxiv_id, announce_date, content) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+            for key, value in (state or {}).items():
+                self._set_state(key, value)
+        return len(rows)
+
+    def get(self, arxiv_id):
+        """
+        :param arxiv_id: string
+        :return: dict or None
+        """
+        row = self.conn.execute(
+            "SELECT content FROM papers WHERE arxiv_id = ?", (arxiv_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, id_list, chunk_size=500):
+        """
+        :param id_list: iterable of strings of arxiv id
+        :param chunk_size: int, the number of ids per sql query
+        :return: dict, arxiv_id: content dict for the ids present in the store
+        """
+        id_list = list(id_list)
+        found = {}
+        for i in range(0, len(id_list), chunk_size):
+            chunk = id_list[i : i + chunk_size]
+            for arxiv_id, content in self.conn.execute(
+                "SELECT arxiv_id, content FROM papers WHERE arxiv_id IN (%s)"
+                % ",".join("?" * len(chunk)),
+                chunk,
+            ):
+                found[arxiv_id] = json.loads(content)
+        return found
+
+    def by_date(self, start, end=None):
+        """
+        :param start: string, the first announce date, eg. "2024-05-20"
+        :param end: string, the last announce date included, default to start
+        :return: generator of content dicts
+        """
+        for (content,) in self.conn.execute(
+            "SELECT content FROM papers WHERE announce_date BETWEEN ? AND ? "
+            "ORDER BY announce_date, arxiv_id",
+            (start, end or start),
+        ):
+            yield json.loads(content)
+
+    def to_paperls(self, start, end=None, search_query=""):
+        return Paperls.from_contents(self.by_date(start, end), search_query)
+
+    def __contains__(self, arxiv_id):
+        return (
+            self.conn.execute(
+                "SELECT 1 FROM papers WHERE arxiv_id = ?", (arxiv_id,)
+            ).fetchone()
+            is not None
+        )
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def _set_state(self, key, value):
+        if value is None:
+            self.conn.execute("DELETE FROM state WHERE key = ?", (key,))
+        else:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def get_state(self, key):
+        row = self.conn.execute(
+            "SELECT value FROM state WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key, value):
+        with self.conn:
+            self._set_state(key, value)
+
+    def close(self):
+        self.conn.close()
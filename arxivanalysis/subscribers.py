@@ -0,0 +1,77 @@
+"""
+subscriber definitions streamed from a jsonl data file
+
+The first line is the mail settings, so that they are known before any subscriber is read::
+
+    {"maildict": {"sender_alias": "arXiv bot", "server": "smtp.example.com", "port": 465}}
+
+every other line is one subscriber, with the same keys as the entries of ``userdata`` in config.py::
+
+    {"user": "a@example.com", "user_alias": "A", "valid": true,
+     "subjects": ["cond-mat", "quant-ph"], "choices": ["topological", "entanglement"]}
+
+A subscriber may also follow authors with "authors", a list of names or a dict of name: weight,
+eg. ["J. Dupont", "Maria Rossi"], any initials variant of the name is matched.
+Blank lines and lines starting with # are skipped. A file whose settings are missing,
+not first, or repeated raises SubscriberError.
+"""
+
+import json
+
+user_keys = ("user", "user_alias", "subjects", "choices")
+
+
+class SubscriberError(Exception):
+    pass
+
+
+def fetch_subscribers(url, path, chunk_size=1 << 16):
+    """
+    download the subscriber file without holding it in memory
+
+    :param url: string
+    :param path: string, the local file to write
+    :return: string, path
+    """
+    import requests
+
+    with requests.get(url, stream=True) as r:
+        r.raise_for_status()
+        with open(path, "wb") as f:
+            for chunk in r.iter_content(chunk_size):
+                f.write(chunk)
+    return path
+
+
+def iter_subscribers(path):
+    """
+    :param path: string, the jsonl file
+    :return: generator of dicts, the mail settings (with the key "maildict") first, then
+            subscribers in file order, subscribers get "valid" default to True
+    """
+    settings = False
+    with open(path, "r") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise SubscriberError("%s:%s: %s" % (path, lineno, e))
+            if "maildict" in record:
+                if settings:
+                    raise SubscriberError("%s:%s: repeated maildict" % (path, lineno))
+                settings = True
+            elif not settings:
+                raise SubscriberError(
+                    "%s:%s: subscriber before the maildict line" % (path, lineno)
+                )
+            else:
+                missing = [k for k in user_keys if k not in record]
+                if missing:
+                    raise SubscriberError(
+                        "%s:%s: missing %s" % (path, lineno, ", ".join(missing))
+                    )
+                record.setdefault("valid", True)
+            yield record
@@ -0,0 +1,398 @@
+"""
+pluggable transport for all network I/O: live, record to a directory, or replay from it
+
+Every http GET of the package (listing pages, API queries, OAI pages, pdfs) goes through
+``current().urlopen`` and every mail through ``current().smtp``, so a whole daily job can
+run offline against recorded responses, eg.::
+
+    install(RecordTransport("fixtures/http"))   # once, against arxiv
+    install(ReplayTransport("fixtures/http", latency=0.2, jitter=0.1, scale=20,
+                            sink=SMTPSink("outbox")))
+
+Replay sleeps a deterministic delay per request, can enlarge recorded listings ``scale``
+times with fresh ids, and serves listings of categories never recorded from the recorded
+ones. Mails go to a local sink instead of an SMTP server.
+"""
+
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+import zlib
+from io import BytesIO
+
+try:
+    # Python 2
+    from urllib2 import Request, urlopen, HTTPError, URLError
+    from httplib import HTTPMessage
+except ImportError:
+    # Python 3
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError, URLError
+    from http.client import HTTPMessage
+
+_listing = re.compile(r"/list/([^/?#]+)/new")
+
+
+class TransportError(URLError):
+    # a request without recording fails like an unreachable server
+    pass
+
+
+def request_key(url, headers=None):
+    """
+    :return: string, the file name stem of a recorded response
+    """
+    rng = (headers or {}).get("Range", "")
+    return hashlib.sha1((url + "\n" + rng).encode("utf-8")).hexdigest()
+
+
+def _message(headers):
+    msg = HTTPMessage()
+    for k, v in headers:
+        msg[k] = v
+    return msg
+
+
+class Response:
+    """
+    recorded or replayed response, with the part of the urlopen response interface in use
+
+    :param url: string
+    :param status: int
+    :param headers: list of (name, value)
+    :param body: bytes
+    """
+
+    def __init__(self, url, status, headers, body):
+        self.url = url
+        self.status = status
+        self.headers = _message(headers)
+        self._fp = BytesIO(body)
+
+    def getcode(self):
+        return self.status
+
+    def read(self, size=-1):
+        return self._fp.read(size)
+
+    def close(self):
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class SMTPSink:
+    """
+    local stand-in of ``smtplib.SMTP_SSL``, messages are kept in memory or written as .eml files
+
+    :param path: string, the directory for the messages, None to keep them in memory
+    :param latency: float, seconds slept for each message
+    """
+
+    def __init__(self, path=None, latency=0.0):
+        self.path = path
+        self.latency = latency
+        self.messages = []
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    def login(self, user, password):
+        return 235, b"accepted"
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            n = len(self.messages)
+            self.messages.append((from_addr, list(to_addrs), len(msg)))
+        if self.path:
+            name = os.path.join(self.path, "%s-%06d.eml" % (os.getpid(), n))
+            with open(name, "w", encoding="utf-8") as f:
+                f.write(msg)
+        return {}
+
+    def quit(self):
+        return 221, b"bye"
+
+
+class LiveTransport:
+    """
+    the network, the default transport
+
+    :param sink: SMTPSink, mails go there instead of the SMTP server when given
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.log = []
+        self._lock = threading.Lock()
+
+    def _record(self, url, status, seconds):
+        with self._lock:
+            self.log.append((url, status, seconds))
+
+    def urlopen(self, url, headers=None, timeout=60):
+        """
+        :return: the response, HTTPError is raised for error status like ``urlopen``
+        """
+        t0 = time.perf_counter()
+        try:
+            resp = urlopen(Request(url, headers=headers or {}), timeout=timeout)
+        except HTTPError as e:
+            self._record(url, e.code, time.perf_counter() - t0)
+            raise
+        self._record(url, resp.getcode(), time.perf_counter() - t0)
+        return resp
+
+    def smtp(self, server, port):
+        if self.sink is not None:
+            return self.sink
+        import smtplib
+
+        return smtplib.SMTP_SSL(server, port)
+
+
+def save_recording(path, url, status, headers, body, request_headers=None):
+    """
+    write one response in the layout ``ReplayTransport`` reads, eg. for hand made fixtures
+
+    :param path: string, the directory of recordings
+    :param url: string
+    :param status: int
+    :param headers: iterable of (name, value), the response headers
+    :param body: bytes
+    :param request_headers: dict, only the Range header is part of the key
+    """
+    stem = os.path.join(path, request_key(url, request_headers))
+    with open(stem + ".body.tmp", "wb") as f:
+        f.write(body)
+    os.replace(stem + ".body.tmp", stem + ".body")
+    meta = {"url": url, "status": status, "headers": list(headers)}
+    with open(stem + ".json.tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(stem + ".json.tmp", stem + ".json")
+
+
+class RecordTransport(LiveTransport):
+    """
+    the network, with every response saved in path for ``ReplayTransport``
+
+    :param path: string, the directory of recordings
+    """
+
+    def __init__(self, path, sink=None):
+        LiveTransport.__init__(self, sink)
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _save(self, url, headers, status, resp_headers, body):
+        save_recording(self.path, url, status, resp_headers.items(), body, headers)
+
+    def urlopen(self, url, headers=None, timeout=60):
+        try:
+            resp = LiveTransport.urlopen(self, url, headers, timeout)
+        except HTTPError as e:
+            body = e.read()
+            self._save(url, headers, e.code, e.headers, body)
+            raise HTTPError(url, e.code, e.msg, e.headers, BytesIO(body))
+        with resp:
+            body = resp.read()
+            status = resp.getcode()
+            resp_headers = resp.headers
+        self._save(url, headers, status, resp_headers, body)
+        return Response(url, status, list(resp_headers.items()), body)
+
+
+class ReplayTransport(LiveTransport):
+    """
+    recorded responses only, nothing leaves the machine
+
+    :param path: string, the directory of recordings
+    :param latency: float, seconds slept before each response
+    :param jitter: float, mean seconds of an extra exponentially distributed delay,
+                    which gives the long tail of real latencies
+    :param seed: int, the delays are determined by the seed, the url and the number of
+                previous requests of the url, independently of thread scheduling
+    :param scale: int, recorded listings are served with each paper repeated scale times
+    :param sink: SMTPSink, default to an in-memory sink
+    """
+
+    def __init__(self, path, latency=0.0, jitter=0.0, seed=0, scale=1, sink=None):
+        LiveTransport.__init__(self, sink if sink is not None else SMTPSink())
+        self.path = path
+        self.latency = latency
+        self.jitter = jitter
+        self.seed = seed
+        self.scale = scale
+        self._seen = {}
+        self._bodies = {}
+        # recorded listings as (key, category)
+        self.listings = []
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".json"):
+                with open(os.path.join(path, name)) as f:
+                    meta = json.load(f)
+                m = _listing.search(meta["url"])
+                if m and meta["status"] == 200:
+                    self.listings.append((name[: -len(".json")], m.group(1)))
+
+    def _delay(self, key):
+        with self._lock:
+            n = self._seen.get(key, 0)
+            self._seen[key] = n + 1
+        rng = random.Random("%s:%s:%s" % (self.seed, key, n))
+        delay = self.latency
+        if self.jitter:
+            delay += rng.expovariate(1.0 / self.jitter)
+        if delay:
+            time.sleep(delay)
+
+    def _load(self, key):
+        stem = os.path.join(self.path, key)
+        if not os.path.exists(stem + ".json"):
+            return None
+        with open(stem + ".json") as f:
+            meta = json.load(f)
+        with open(stem + ".body", "rb") as f:
+            body = f.read()
+        return meta["status"], meta["headers"], body
+
+    def _response(self, url, headers):
+        for key in (request_key(url, headers), request_key(url)):
+            if key not in self._bodies:
+                recorded = self._load(key)
+                if recorded is not None and _listing.search(url):
+                    status, hdrs, body = recorded
+                    body = enlarge_listing(body, self.scale)
+                    recorded = status, hdrs, body
+                self._bodies[key] = recorded
+            if self._bodies[key] is not None:
+                return key, self._bodies[key]
+        m = _listing.search(url)
+        if m and self.listings:
+            # a category never recorded gets one of the recorded listings with other ids
+            key = request_key(url)
+            salt = zlib.crc32(m.group(1).encode("utf-8"))
+            status, hdrs, body = self._load(self.listings[salt % len(self.listings)][0])
+            self._bodies[key] = status, hdrs, enlarge_listing(body, self.scale, salt)
+            return key, self._bodies[key]
+        raise TransportError("no recording for %s" % url)
+
+    def urlopen(self, url, headers=None, timeout=60):
+        t0 = time.perf_counter()
+        with self._lock:
+            key, (status, hdrs, body) = self._response(url, headers)
+        self._delay(key)
+        self._record(url, status, time.perf_counter() - t0)
+        if status >= 400:
+            raise HTTPError(url, status, "replayed", _message(hdrs), BytesIO(body))
+        # the recorded length no longer holds for enlarged listings
+        hdrs = [(k, v) for k, v in hdrs if k.lower() != "content-length"]
+        hdrs.append(("Content-Length", str(len(body))))
+        return Response(url, status, hdrs, body)
+
+
+_item = re.compile(rb"<dt>.*?</dd>", re.S)
+_abs = re.compile(rb"""href\s*=\s*["']/abs/([^"']+)["']""")
+_new_id = re.compile(rb"^(\d{4})\.(\d{4,5})$")
+
+
+def enlarge_listing(body, scale=1, salt=0):
+    """
+    repeat each paper of a listing page scale times under distinct ids
+
+    :param body: bytes, the html of ``/list/<cat>/new``
+    :param scale: int, the number of copies of each paper
+    :param salt: int, ids are shifted by it, 0 keeps the recorded ids of the first copy
+    :return: bytes
+    """
+    if scale <= 1 and not salt:
+        return body
+    used = set()
+
+    def renumber(m, copy):
+        item = m.group(0)
+        found = _abs.search(item)
+        if not found:
+            return item
+        old = found.group(1)
+        ids = _new_id.match(old)
+        if ids:
+            width = len(ids.group(2))
+            n = int(ids.group(2)) + copy * 7919 + salt
+            new = b"%s.%0*d" % (ids.group(1), width, n % 10**width)
+            while new in used:
+                n += 1
+                new = b"%s.%0*d" % (ids.group(1), width, n % 10**width)
+        else:
+            new = old + b".%d" % (copy + salt)
+        used.add(new)
+        return item.replace(old, new)
+
+    def section(m):
+        block = m.group(0)
+        items = list(_item.finditer(block))
+        if not items:
+            return block
+        start, end = items[0].start(), items[-1].end()
+        copies = [
+            b"\n".join(renumber(it, copy) for it in items) for copy in range(scale)
+        ]
+        return block[:start] + b"\n".join(copies) + block[end:]
+
+    return re.sub(rb"<dl[^>]*>.*?</dl>", section, body, flags=re.S)
+
+
+_current = LiveTransport()
+
+
+def current():
+    return _current
+
+
+def install(transport):
+    """
+    :param transport: LiveTransport, RecordTransport or ReplayTransport
+    :return: the transport installed before
+    """
+    global _current
+    previous, _current = _current, transport
+    return previous
+
+
+def from_env():
+    """
+    transport described by the environment:
+    ARXIV_TRANSPORT as "live", "record:<dir>" or "replay:<dir>",
+    ARXIV_REPLAY_LATENCY, ARXIV_REPLAY_JITTER, ARXIV_REPLAY_SEED and ARXIV_REPLAY_SCALE for replay,
+    ARXIV_SMTP_SINK=<dir> to write mails there instead of sending them
+
+    :return: the transport
+    """
+    spec = os.environ.get("ARXIV_TRANSPORT", "live")
+    sink_path = os.environ.get("ARXIV_SMTP_SINK")
+    sink = SMTPSink(sink_path) if sink_path else None
+    mode, _, path = spec.partition(":")
+    if mode == "live":
+        return LiveTransport(sink)
+    if mode == "record" and path:
+        return RecordTransport(path, sink)
+    if mode == "replay" and path:
+        return ReplayTransport(
+            path,
+            latency=float(os.environ.get("ARXIV_REPLAY_LATENCY", "0")),
+            jitter=float(os.environ.get("ARXIV_REPLAY_JITTER", "0")),
+            seed=int(os.environ.get("ARXIV_REPLAY_SEED", "0")),
+            scale=int(os.environ.get("ARXIV_REPLAY_SCALE", "1")),
+            sink=sink,
+        )
+    raise TransportError("unknown ARXIV_TRANSPORT %s" % spec)
@@ -0,0 +1,348 @@
+"""
+benchmark suite for the hot paths of the daily pipeline
+
+usage::
+
+    python benchmarks/bench.py --output bench.json
+    python benchmarks/bench.py --output new.json --compare bench.json
+    python benchmarks/bench.py --record cond-mat quant-ph  # save real pages as fixtures
+    python benchmarks/bench.py --import-only  # only the cold start budget check
+"""
+
+import os
+import sys
+import json
+import time
+import copy
+import argparse
+import platform
+import subprocess
+import statistics
+
+_here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(_here))
+sys.path.insert(0, _here)
+
+import fixtures
+
+stoppath = os.path.join(os.path.dirname(_here), "arxivanalysis", "SmartStopList.txt")
+
+
+def timeit(func, setup=None, repeat=5):
+    """
+    time func(setup()) repeat times, setup is excluded from the timing
+
+    :return: list of float, seconds for each run
+    """
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        t0 = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def summarize(times, items):
+    median = statistics.median(times)
+    return {
+        "min": min(times),
+        "median": median,
+        "mean": statistics.mean(times),
+        "repeat": len(times),
+        "items": items,
+        "per_item": median / items if items else None,
+    }
+
+
+def git_commit():
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "HEAD"],
+                cwd=_here,
+                stderr=subprocess.DEVNULL,
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# dependencies which must not be loaded by a bare import of the modules below
+heavy_modules = [
+    "fuzzywuzzy",
+    "requests",
+    "bs4",
+    "lxml",
+    "feedparser",
+    "smtplib",
+    "arxivanalysis.notification",
+]
+
+light_modules = ["arxivanalysis.paperls", "arxivanalysis.rake", "arxivanalysis.cons"]
+
+_import_snippet = """
+import sys, time, json
+t0 = time.perf_counter()
+import %s
+t = time.perf_counter() - t0
+print(json.dumps([t, [m for m in %r if m in sys.modules]]))
+"""
+
+
+def import_time(module, repeat=5):
+    """
+    time ``import module`` in fresh interpreters
+
+    :return: tuple of list of float, seconds of each import, and list of heavy modules loaded
+    """
+    times = []
+    loaded = []
+    for _ in range(repeat):
+        out = subprocess.check_output(
+            [sys.executable, "-c", _import_snippet % (module, heavy_modules)],
+            cwd=os.path.dirname(_here),
+        )
+        t, loaded = json.loads(out.decode().strip().splitlines()[-1])
+        times.append(t)
+    return times, loaded
+
+
+def check_imports(results, budget, repeat=5):
+    """
+    record cold import time of light modules and check them against the startup budget
+
+    :return: list of strings, the violations found
+    """
+    violations = []
+    for module in light_modules:
+        times, loaded = import_time(module, repeat=repeat)
+        results["import/" + module] = summarize(times, 1)
+        median = results["import/" + module]["median"]
+        print("%-45s median %10.3f ms" % ("import/" + module, median * 1e3))
+        if median > budget:
+            violations.append(
+                "import %s took %.1f ms, over the budget of %.1f ms"
+                % (module, median * 1e3, budget * 1e3)
+            )
+        if loaded:
+            violations.append("import %s loads %s" % (module, ", ".join(loaded)))
+    return violations
+
+
+def listings(sizes):
+    for n in sizes:
+        yield "synthetic-%s" % n, fixtures.synthetic_listing(n, seed=n)
+    for name, text in fixtures.recorded("list"):
+        yield name, text
+
+
+def feeds(sizes):
+    for n in sizes:
+        yield "synthetic-%s" % n, fixtures.synthetic_feed(n, seed=n)
+    for name, text in fixtures.recorded("feed"):
+        yield name, text
+
+
+def run(args):
+    import feedparser
+    from arxivanalysis.arxiv import parse_entries
+    from arxivanalysis.rake import Rake
+    from arxivanalysis.notification import makemailcontent
+    from arxivanalysis.paperls import (
+        Paperls,
+        parse_submission,
+        normalize_query_result,
+        select_tags,
+        deduplicate_tags,
+        kw_lst2dict,
+    )
+
+    results = {}
+
+    def record(name, times, items):
+        results[name] = summarize(times, items)
+        r = results[name]
+        print("%-45s median %10.3f ms  (%s items)" % (name, r["median"] * 1e3, items))
+
+    rake = Rake(stoppath)
+    corpora = {}
+    for name, html in listings(args.sizes):
+        contents = parse_submission(html, mode=2)
+        record(
+            "new_submission_parse/%s" % name,
+            timeit(lambda _: parse_submission(html, mode=2), repeat=args.repeat),
+            len(contents),
+        )
+        corpora[name] = contents
+
+    for name, xml in feeds(args.sizes):
+        n = len(feedparser.parse(xml)["entries"])
+        record(
+            "query_feedparse/%s" % name,
+            timeit(lambda _: feedparser.parse(xml), repeat=args.repeat),
+            n,
+        )
+        record(
+            "query_postprocess/%s" % name,
+            timeit(
+                lambda entries: [
+                    normalize_query_result(c) for c in parse_entries(entries)
+                ],
+                setup=lambda: feedparser.parse(xml)["entries"],
+                repeat=args.repeat,
+            ),
+            n,
+        )
+
+    for name, contents in corpora.items():
+        texts = [c["title"] + ". " + c["summary"] + " " + c["title"] for c in contents]
+        record(
+            "rake_run/%s" % name,
+            timeit(lambda _: [rake.run(t) for t in texts], repeat=args.repeat),
+            len(texts),
+        )
+        ranks = [select_tags(rake.run(t)) for t in texts]
+        record(
+            "deduplicate_tags/%s" % name,
+            timeit(lambda _: [deduplicate_tags(r) for r in ranks], repeat=args.repeat),
+            len(ranks),
+        )
+        for c, r in zip(contents, ranks):
+            c["tags"] = deduplicate_tags(r)
+
+    for name, contents in corpora.items():
+        for nkw in args.keywords:
+            choices = kw_lst2dict(fixtures.synthetic_keywords(nkw, seed=nkw, authors=2))
+
+            def fresh():
+                return Paperls.from_contents(copy.deepcopy(contents))
+
+            record(
+                "interest_match/%s/kw%s" % (name, nkw),
+                timeit(lambda lst: lst.interest_match(choices), fresh, args.repeat),
+                len(contents),
+            )
+            matched = fresh()
+            matched.interest_match(choices)
+            record(
+                "show_relevant/%s/kw%s" % (name, nkw),
+                timeit(
+                    lambda _: matched.show_relevant(purify=True), repeat=args.repeat
+                ),
+                len(contents),
+            )
+            rs = matched.show_relevant(purify=True)
+            record(
+                "makemailcontent/%s/kw%s" % (name, nkw),
+                timeit(lambda _: makemailcontent("headline", rs), repeat=args.repeat),
+                len(rs),
+            )
+
+    html = fixtures.synthetic_listing(args.sizes[-1], seed=0)
+    users = [
+        {
+            "subjects": ["cond-mat", "quant-ph", "hep-th"][: 1 + i % 3],
+            "choices": fixtures.synthetic_keywords(5 + i % 20, seed=i, authors=i % 3),
+        }
+        for i in range(args.users)
+    ]
+
+    def end_to_end(_):
+        # the same flow as scripts/run-mail.py, with the mail rendered instead of sent
+        paper_ls_dict = {}
+        for u in users:
+            lst = Paperls.from_contents([])
+            for sub in u["subjects"]:
+                if sub not in paper_ls_dict:
+                    pl = Paperls.from_contents(parse_submission(html, mode=0), sub)
+                    pl.tagging(stoppath)
+                    paper_ls_dict[sub] = pl
+                lst.merge(paper_ls_dict[sub])
+            lst.interest_match(kw_lst2dict(u["choices"]))
+            rs = lst.show_relevant(purify=True)
+            if rs:
+                makemailcontent("headline", rs)
+
+    record(
+        "end_to_end/users%s" % args.users,
+        timeit(end_to_end, repeat=max(1, args.repeat // 2)),
+        args.users,
+    )
+    return results
+
+
+def compare(new, old, threshold):
+    """
+    print the ratio of medians against an older result file
+
+    :return: list of strings, names of benchmarks slower than 1 + threshold
+    """
+    regressions = []
+    for name, r in sorted(new["results"].items()):
+        if name not in old["results"]:
+            continue
+        ratio = r["median"] / old["results"][name]["median"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print("%-45s %6.2fx%s" % (name, ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[25, 100])
+    parser.add_argument("--keywords", type=int, nargs="+", default=[5, 20])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results as json to this file")
+    parser.add_argument("--compare", help="json result of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--record", nargs="+", metavar="CATEGORY")
+    parser.add_argument(
+        "--import-budget",
+        type=float,
+        default=0.1,
+        help="max seconds for a cold import of the light modules",
+    )
+    parser.add_argument("--import-only", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        for path in fixtures.record(args.record):
+            print("recorded", path)
+        return 0
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": vars(args),
+        },
+        "results": {},
+    }
+    violations = check_imports(results["results"], args.import_budget, args.repeat)
+    if not args.import_only:
+        results["results"].update(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        violations += [
+            "regression in " + n for n in compare(results, old, args.threshold)
+        ]
+    for v in violations:
+        print("FAILED:", v)
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+synthetic and recorded fixtures for the benchmark suite
+"""
+
+import os
+import random
+from datetime import date, datetime, timedelta
+from xml.sax.saxutils import escape
+
+fixture_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+_vocabulary = (
+    "quantum topological phase transition entanglement spin liquid lattice gauge "
+    "field theory superconductivity magnetic order fermion boson many-body "
+    "localization disorder neural network machine learning tensor network "
+    "renormalization group symmetry protected edge state Hall effect Weyl semimetal "
+    "Dirac cone Floquet driven non-Hermitian dynamics thermalization correlation "
+    "function Monte Carlo simulation density matrix variational ansatz anyon "
+    "braiding Majorana zero mode qubit error correction circuit measurement "
+    "induced criticality holography black hole conformal boundary"
+).split()
+
+_filler = (
+    "we the of in and a to is that for with this by on are as an which be these "
+    "show study find propose demonstrate results model novel approach recent"
+).split()
+
+_first_names = (
+    "Alice Bob Chen Dmitri Eva Fatima Gustavo Hiroshi "
+    "Ingrid Jun Kwame Li Maria Nikolai Olga Pedro"
+).split()
+
+_last_names = (
+    "Smith Wang Ivanov Garcia Tanaka Müller Okafor Zhang "
+    "Rossi Kim Dubois Nowak Silva Hansen Cohen Li"
+).split()
+
+_subjects = [
+    ("Strongly Correlated Electrons", "cond-mat.str-el"),
+    ("Mesoscale and Nanoscale Physics", "cond-mat.mes-hall"),
+    ("Quantum Physics", "quant-ph"),
+    ("Statistical Mechanics", "cond-mat.stat-mech"),
+    ("High Energy Physics - Theory", "hep-th"),
+    ("Machine Learning", "cs.LG"),
+]
+
+
+def _phrase(rng, n):
+    words = []
+    for _ in range(n):
+        if rng.random() < 0.35:
+            words.append(rng.choice(_filler))
+        else:
+            words.append(rng.choice(_vocabulary))
+    return " ".join(words)
+
+
+def synthetic_paper(rng, i):
+    """
+    one synthetic paper as a dict of raw fields
+
+    :param rng: random.Random
+    :param i: int, the index of the paper, which determines the arxiv id
+    :return: dict
+    """
+    nsentence = rng.randint(5, 10)
+    summary = ". ".join(
+        _phrase(rng, rng.randint(10, 25)).capitalize() for _ in range(nsentence)
+    )
+    return {
+        "arxiv_id": "2405.%05d" % (i + 1),
+        "title": _phrase(rng, rng.randint(6, 14)).capitalize(),
+        "authors": [
+            rng.choice(_first_names) + " " + rng.choice(_last_names)
+            for _ in range(rng.randint(1, 8))
+        ],
+        "subjects": rng.sample(_subjects, rng.randint(1, 3)),
+        "summary": summary + ".",
+    }
+
+
+def _listing_item(paper, n):
+    authors = ", ".join(
+        '<a href="https://arxiv.org/a/%s">%s</a>' % (a.replace(" ", "_"), escape(a))
+        for a in paper["authors"]
+    )
+    subjects = "; ".join("%s (%s)" % s for s in paper["subjects"])
+    return (
+        '<dt><a name="item%s">[%s]</a> <a href="/abs/%s" title="Abstract" id="%s">'
+        'arXiv:%s</a> [<a href="/pdf/%s">pdf</a>]</dt>\n'
+        "<dd><div class='meta'>\n"
+        "<div class='list-title mathjax'><span class='descriptor'>Title:</span>\n%s\n</div>\n"
+        "<div class='list-authors'>%s</div>\n"
+        "<div class='list-subjects'><span class='descriptor'>Subjects:</span>\n%s</div>\n"
+        "<p class='mathjax'>\n%s\n</p>\n</div></dd>\n"
+    ) % (
+        n,
+        n,
+        paper["arxiv_id"],
+        paper["arxiv_id"],
+        paper["arxiv_id"],
+        paper["arxiv_id"],
+        escape(paper["title"]),
+        authors,
+        subjects,
+        escape(paper["summary"]),
+    )
+
+
+def synthetic_listing(n_new, n_cross=None, seed=0, day=None):
+    """
+    html of ``/list/<cat>/new`` page in the layout after 24.05
+
+    :param n_new: int, the number of new submissions
+    :param n_cross: int, the number of cross-lists, default to half of n_new
+    :param seed: int, the random seed
+    :param day: datetime.date, the announce date in the headline, default to today
+    :return: string, html text
+    """
+    if n_cross is None:
+        n_cross = n_new // 2
+    day = day or date.today()
+    rng = random.Random(seed)
+    papers = [synthetic_paper(rng, i) for i in range(n_new + n_cross)]
+    html = [
+        "<html><body><div id='dlpage'>",
+        "<h3>Showing new listings for %s</h3>" % day.strftime("%A, %d %B %Y"),
+        "<h3>New submissions (showing %s of %s entries)</h3><dl>" % (n_new, n_new),
+    ]
+    html += [_listing_item(p, i + 1) for i, p in enumerate(papers[:n_new])]
+    html.append("</dl>")
+    html.append(
+        "<h3>Cross-lists (showing %s of %s entries)</h3><dl>" % (n_cross, n_cross)
+    )
+    html += [_listing_item(p, n_new + i + 1) for i, p in enumerate(papers[n_new:])]
+    html.append("</dl></div></body></html>")
+    return "\n".join(html)
+
+
+def synthetic_feed(n, seed=0):
+    """
+    arxiv API Atom feed
+
+    :param n: int, the number of entries
+    :param seed: int, the random seed
+    :return: string, xml text
+    """
+    rng = random.Random(seed)
+    published = datetime(2024, 5, 20, 17, 0, 0)
+    entries = []
+    for i in range(n):
+        p = synthetic_paper(rng, i)
+        stamp = (published - timedelta(hours=7 * i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        entries.append(
+            "<entry><id>http://arxiv.org/abs/%sv1</id>"
+            "<updated>%s</updated><published>%s</published>"
+            "<title>%s</title><summary>%s</summary>%s"
+            '<link href="http://arxiv.org/abs/%sv1" rel="alternate" type="text/html"/>'
+            '<link title="pdf" href="http://arxiv.org/pdf/%sv1" rel="related" type="application/pdf"/>'
+            '<arxiv:primary_category term="%s" scheme="http://arxiv.org/schemas/atom"/>'
+            "%s</entry>"
+            % (
+                p["arxiv_id"],
+                stamp,
+                stamp,
+                escape(p["title"]),
+                escape(p["summary"]),
+                "".join(
+                    "<author><name>%s</name></author>" % escape(a) for a in p["authors"]
+                ),
+                p["arxiv_id"],
+                p["arxiv_id"],
+                p["subjects"][0][1],
+                "".join(
+                    '<category term="%s" scheme="http://arxiv.org/schemas/atom"/>'
+                    % s[1]
+                    for s in p["subjects"]
+                ),
+            )
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom" '
+        'xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/" '
+        'xmlns:arxiv="http://arxiv.org/schemas/atom">'
+        "<title>ArXiv Query</title><opensearch:totalResults>%s</opensearch:totalResults>"
+        "%s</feed>" % (n, "".join(entries))
+    )
+
+
+def synthetic_keywords(n, seed=0, authors=0):
+    """
+    keyword list of one simulated user, most important first
+
+    :param n: int, the number of keyword phrases
+    :param seed: int, the random seed
+    :param authors: int, the number of author names mixed into the keywords
+    :return: list of strings
+    """
+    rng = random.Random(seed)
+    kws = [" ".join(rng.sample(_vocabulary, rng.randint(1, 3))) for _ in range(n)]
+    kws += [
+        rng.choice(_first_names) + " " + rng.choice(_last_names) for _ in range(authors)
+    ]
+    return kws
+
+
+def record(categories, dest=fixture_dir, feed_query="cat:cond-mat.str-el", n=100):
+    """
+    save real ``/list/<cat>/new`` pages and one API feed as recorded fixtures
+
+    :param categories: list of strings, eg. ["cond-mat", "quant-ph"]
+    :param dest: string, the directory for the fixtures
+    :param feed_query: string, search_query for the recorded API feed
+    :param n: int, max_results for the recorded API feed
+    :return: list of strings, the paths written
+    """
+    import requests
+    from urllib.parse import urlencode
+
+    os.makedirs(dest, exist_ok=True)
+    paths = []
+    for cat in categories:
+        r = requests.get("https://arxiv.org/list/" + cat + "/new")
+        path = os.path.join(dest, "list-%s.html" % cat)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(r.text)
+        paths.append(path)
+    url = "http://export.arxiv.org/api/query?" + urlencode(
+        {"search_query": feed_query, "max_results": n}
+    )
+    r = requests.get(url)
+    path = os.path.join(dest, "feed-%s.xml" % feed_query.replace(":", "_"))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(r.text)
+    paths.append(path)
+    return paths
+
+
+def recorded(kind, src=fixture_dir):
+    """
+    iterate over recorded fixtures
+
+    :param kind: string, "list" for listing html, "feed" for API feed xml
+    :param src: string, the directory of the fixtures
+    :return: generator of (name, text)
+    """
+    if not os.path.isdir(src):
+        return
+    for name in sorted(os.listdir(src)):
+        if name.startswith(kind + "-"):
+            with open(os.path.join(src, name), encoding="utf-8") as f:
+                yield os.path.splitext(name)[0], f.read()
@@ -0,0 +1,243 @@
+"""
+offline load test of the daily job against recorded arxiv responses
+
+usage::
+
+    python benchmarks/loadtest.py --record cond-mat quant-ph  # once, against arxiv
+    python benchmarks/loadtest.py --categories 40 --users 5000 --scale 10 \\
+        --latency 0.2 --jitter 0.1 --shards 4 --output load.json
+
+Listing pages are replayed by ``transport.ReplayTransport``, enlarged ``--scale`` times,
+categories beyond the recorded ones are synthesized from them, and mails go to an
+``SMTPSink``. Reported are the throughput of users and the p50/p95/p99 latency of
+fetches and of the matching and mailing for each user.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import importlib.util
+
+_here = os.path.dirname(os.path.abspath(__file__))
+_root = os.path.dirname(_here)
+sys.path.insert(0, _root)
+sys.path.insert(0, _here)
+
+import fixtures
+from bench import git_commit
+from arxivanalysis import metrics, transport
+from arxivanalysis.paperls import Paperls
+
+stoppath = os.path.join(_root, "arxivanalysis", "SmartStopList.txt")
+http_dir = os.path.join(fixtures.fixture_dir, "http")
+
+
+def load_run_mail():
+    """
+    :return: module, scripts/run-mail.py, whose per user functions are measured
+    """
+    spec = importlib.util.spec_from_file_location(
+        "run_mail", os.path.join(_root, "scripts", "run-mail.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.stoppath = stoppath
+    return module
+
+
+def percentiles(values, ps=(50, 95, 99)):
+    """
+    :return: dict, "p50" etc. by nearest rank, with "max" and "count"
+    """
+    values = sorted(values)
+    r = {"count": len(values)}
+    if not values:
+        return r
+    for p in ps:
+        r["p%s" % p] = values[max(0, -(-p * len(values) // 100) - 1)]
+    r["max"] = values[-1]
+    return r
+
+
+def synthetic_users(n, categories, seed=0):
+    rng = random.Random(seed)
+    users = []
+    for i in range(n):
+        users.append(
+            {
+                "user": "user%s@example.com" % i,
+                "user_alias": "User %s" % i,
+                "valid": True,
+                "subjects": rng.sample(
+                    categories, min(len(categories), rng.randint(1, 3))
+                ),
+                "choices": fixtures.synthetic_keywords(5 + i % 20, seed=i % 97),
+            }
+        )
+    return users
+
+
+def record(categories, dest=http_dir):
+    """
+    fetch listings through a RecordTransport, saving them for replay
+    """
+    previous = transport.install(transport.RecordTransport(dest))
+    try:
+        for cat in categories:
+            Paperls(search_mode=2, search_query=cat, start=2)
+    finally:
+        transport.install(previous)
+
+
+def build_corpus(categories, mode=2):
+    # the shape of run-mail.get_paperls, without the check for today's date
+    corpus = {}
+    for cat in categories:
+        pl = Paperls(search_mode=2, search_query=cat, start=mode)
+        pl.tagging(stoppath)
+        corpus[cat] = pl
+    return corpus
+
+
+def run_sequential(rm, users, corpus, maildict):
+    latencies = []
+    for u in users:
+        t0 = time.perf_counter()
+        maildict["user"] = u["user"]
+        maildict["user_alias"] = u["user_alias"]
+        rm.user_papers(u, corpus).mail(maildict)
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def run_sharded(rm, users, corpus, maildict, shards, spool):
+    from arxivanalysis.notification import sendmail
+    from arxivanalysis.shard import run_sharded as run
+
+    for u in users:
+        rm.read_kw(u["choices"])
+
+    def timed(u, context):
+        t0 = time.perf_counter()
+        r = rm.user_digest(u, context)
+        r["seconds"] = time.perf_counter() - t0
+        return r
+
+    finished, lost = run(
+        timed, users, spool, shards, {"corpus": corpus, "ledger": None}
+    )
+    latencies = []
+    for r in finished:
+        if r["error"] is not None:
+            continue
+        t0 = time.perf_counter()
+        if r["result"]["content"]:
+            maildict["user"] = r["item"]["user"]
+            maildict["user_alias"] = r["item"]["user_alias"]
+            maildict["content"] = r["result"]["content"]
+            maildict["title"] = "Report on highlight of arXiv"
+            sendmail(**maildict)
+        latencies.append(r["result"]["seconds"] + time.perf_counter() - t0)
+    return latencies, len(lost) + sum(1 for r in finished if r["error"] is not None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--dir", default=http_dir, help="directory of recordings")
+    parser.add_argument("--record", nargs="+", metavar="CATEGORY")
+    parser.add_argument("--categories", type=int, default=0)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--outbox", help="directory to write the mails to")
+    parser.add_argument("--output", help="write the report as json")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record(args.record, args.dir)
+        return 0
+
+    replay = transport.ReplayTransport(
+        args.dir,
+        latency=args.latency,
+        jitter=args.jitter,
+        seed=args.seed,
+        scale=args.scale,
+        sink=transport.SMTPSink(args.outbox),
+    )
+    if not replay.listings:
+        print("no recorded listings in %s, run with --record first" % args.dir)
+        return 1
+    transport.install(replay)
+    categories = sorted(set(cat for _, cat in replay.listings))
+    categories += ["synthetic-%s" % i for i in range(args.categories - len(categories))]
+    users = synthetic_users(args.users, categories, args.seed)
+    rm = load_run_mail()
+    maildict = {
+        "sender": "bot@example.com",
+        "sender_alias": "arXiv bot",
+        "password": "",
+        "server": "localhost",
+        "port": 465,
+    }
+    recorder = metrics.enable()
+
+    t0 = time.perf_counter()
+    corpus = build_corpus(categories)
+    corpus_seconds = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    failed = 0
+    if args.shards > 1:
+        import tempfile
+
+        latencies, failed = run_sharded(
+            rm, users, corpus, maildict, args.shards, tempfile.mkdtemp(prefix="load-")
+        )
+    else:
+        latencies = run_sequential(rm, users, corpus, maildict)
+    users_seconds = time.perf_counter() - t0
+    metrics.disable()
+
+    report = {
+        "commit": git_commit(),
+        "options": vars(args),
+        "categories": len(categories),
+        "papers": sum(len(pl.contents) for pl in corpus.values()),
+        "fetch": percentiles([r[2] for r in replay.log]),
+        "corpus_seconds": corpus_seconds,
+        "users": len(users),
+        "failed": failed,
+        "mails": len(replay.sink.messages),
+        "users_seconds": users_seconds,
+        "throughput": len(latencies) / users_seconds if users_seconds else None,
+        "latency": percentiles(latencies),
+        "total_seconds": corpus_seconds + users_seconds,
+        "stages": recorder.summary(),
+    }
+    for key in ("categories", "papers", "users", "failed", "mails"):
+        print("%-16s %s" % (key, report[key]))
+    print("%-16s %.3f s" % ("corpus", corpus_seconds))
+    print("%-16s %.2f users/s" % ("throughput", report["throughput"] or 0))
+    for name in ("fetch", "latency"):
+        print(
+            "%-16s " % name
+            + "  ".join(
+                "%s %.1f ms" % (k, v * 1000)
+                for k, v in report[name].items()
+                if k != "count"
+            )
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,67 +1,245 @@
+import os
 import sys
+import shutil
+import tempfile
 
 sys.path.insert(0, "./")
-from arxivanalysis.paperls import Paperls, kw_lst2dict
+from arxivanalysis.paperls import Paperls, arxivException, author_match
+from arxivanalysis.authors import follow_all
+from arxivanalysis.matcher import MatcherCache
+from arxivanalysis.subscribers import iter_subscribers, fetch_subscribers
+from arxivanalysis import metrics
+from arxivanalysis import transport
 import requests
 
 stoppath = "./arxivanalysis/SmartStopList.txt"
+subscriber_path = "subscribers.jsonl"
+
+
+# set ARXIV_MATCHER_CACHE=/path/cache.json to keep compiled keyword sets across runs
+_matchers = MatcherCache(os.environ.get("ARXIV_MATCHER_CACHE"))
 
 
 def read_kw(choices):
-    if isinstance(choices, dict):
-        return choices
-    elif isinstance(choices, list):
-        return kw_lst2dict(choices)
-    elif isinstance(choices, str) and len(choices) > 0:
-        wordlist = []
-        with open(choices, "r") as datafile:
-            for line in datafile:
-                wordlist.append(line)
-        return kw_lst2dict(wordlist)
-    else:
-        return {}
+    # identical keyword sets share one compiled matcher
+    return _matchers.get(choices)
 
 
 _paper_ls_dict = {}
 
 
+def get_paperls(sub):
+    if sub not in _paper_ls_dict:
+        pl = Paperls(
+            search_mode=2,
+            search_query=sub,
+            start=0,
+            sort_by="submittedDate",
+        )
+        pl.tagging(stoppath)
+        _paper_ls_dict[sub] = pl
+    return _paper_ls_dict[sub]
+
+
 def curl_config():
+    """
+    :return: string, "jsonl" or "config", the kind of config just fetched
+    """
     url = sys.argv[1]
+    # a jsonl subscriber file is streamed as data instead of imported as code
+    if url.split("?")[0].endswith(".jsonl"):
+        fetch_subscribers(url, subscriber_path)
+        return "jsonl"
     r = requests.get(url)
     with open("config.py", "wb") as f:
         f.write(r.content)
+    return "config"
 
 
-def main():
+def load_config(credentials, mode):
+    """
+    :param credentials: dict, sender and password, which are never read from the config
+    :param mode: string, "jsonl" or "config", as returned by ``curl_config``
+    :return: tuple of maildict and iterable of user dicts
+    """
+    # files left by earlier runs are ignored, only the fetched kind is read
+    if mode == "jsonl":
+        records = iter_subscribers(subscriber_path)
+        # the settings line comes first, so maildict is complete before any user
+        maildict = dict(next(records, {"maildict": {}})["maildict"])
+        maildict.update(credentials)
+        return maildict, records
     from config import maildict
     from config import userdata
 
+    maildict.update(credentials)
+    return maildict, userdata
+
+
+_snapshots = {}
+
+
+def open_corpus(src):
+    # corpus entries are either Paperls or the path of its snapshot
+    if isinstance(src, str):
+        from arxivanalysis.snapshot import load
+
+        if src not in _snapshots:
+            _snapshots[src] = load(src)
+        return _snapshots[src]
+    return src
+
+
+_ledgers = {}
+
+
+def open_ledger(path):
+    # one connection per process, sqlite connections must not cross a fork
+    from arxivanalysis.ledger import SentLedger
+
+    if path not in _ledgers:
+        _ledgers[path] = SentLedger(path)
+    return _ledgers[path]
+
+
+def user_papers(u, corpus, ledger_path=None):
+    sources = [open_corpus(corpus[sub]) for sub in u["subjects"]]
+    lst = Paperls.from_contents([])
+    for src in sources:
+        lst.merge(src)
+    if ledger_path:
+        lst.drop_sent(open_ledger(ledger_path), u["user"])
+    lst.interest_match(read_kw(u["choices"]))
+    authors = u.get("authors")
+    if authors:
+        # looked up in the index of each subject, built once, instead of indexing every list
+        hits = follow_all([src.author_index for src in sources], authors)
+        author_match(lst.contents, hits, authors)
+    return lst
+
+
+def user_digest(u, context):
+    lst = user_papers(u, context["corpus"], context["ledger"])
+    return {
+        "content": lst.digest(),
+        "ids": [c["arxiv_id"] for c in lst.show_relevant()],
+    }
+
+
+def write_snapshots(corpus):
+    """
+    set ARXIV_SNAPSHOT=/path/dir to keep the tagged corpus as memory-mapped snapshots,
+    which later jobs can reuse
+
+    :param corpus: dict, subject: Paperls
+    :return: dict, subject: the path of its snapshot, corpus itself if ARXIV_SNAPSHOT is unset
+    """
+    snapshot_dir = os.environ.get("ARXIV_SNAPSHOT")
+    if not snapshot_dir:
+        return corpus
+    from arxivanalysis.snapshot import write_snapshot
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    return {
+        sub: write_snapshot(pl, os.path.join(snapshot_dir, "%s.snap" % sub))
+        for sub, pl in corpus.items()
+    }
+
+
+def main_sharded(maildict, userdata, workers, ledger_path=None):
+    from arxivanalysis.notification import sendmail
+    from arxivanalysis.shard import run_sharded
+
+    users = [u for u in userdata if u["valid"] is True]
+    # compiled before forking, so shards inherit the matchers and the cache records them
+    for u in users:
+        read_kw(u["choices"])
+    # the tagged corpus is built once and shared by all shards
+    corpus = {}
+    for u in users:
+        for sub in u["subjects"]:
+            corpus[sub] = get_paperls(sub)
+    # with ARXIV_SNAPSHOT set, shards open the snapshots read-only
+    corpus = write_snapshots(corpus)
+    # set ARXIV_SPOOL=/path/dir to keep the per shard results, one subdirectory per run,
+    # otherwise they are removed as soon as they are read, they hold addresses and digests
+    spool = os.environ.get("ARXIV_SPOOL")
+    context = {"corpus": corpus, "ledger": ledger_path}
+    if spool:
+        finished, lost = run_sharded(user_digest, users, spool, workers, context)
+    else:
+        spool = tempfile.mkdtemp(prefix="arxiv-spool-")
+        try:
+            finished, lost = run_sharded(user_digest, users, spool, workers, context)
+        finally:
+            shutil.rmtree(spool, ignore_errors=True)
+    failed = [u["user"] for u in lost]
+    for r in finished:
+        u = r["item"]
+        if r["error"] is not None:
+            print("failed to match for %s: %s" % (u["user"], r["error"]))
+            failed.append(u["user"])
+        elif r["result"]["content"]:
+            maildict["user"] = u["user"]
+            maildict["user_alias"] = u["user_alias"]
+            maildict["content"] = r["result"]["content"]
+            maildict["title"] = "Report on highlight of arXiv"
+            if not sendmail(**maildict):
+                failed.append(u["user"])
+            elif ledger_path:
+                open_ledger(ledger_path).add(u["user"], r["result"]["ids"])
+    if failed:
+        raise arxivException("no mail sent to %s" % ", ".join(failed))
+
+
+def main(mode="config"):
     sendmail, password = sys.argv[2:]
-    maildict.update({"sender": sendmail, "password": password})
+    maildict, userdata = load_config({"sender": sendmail, "password": password}, mode)
+    # set ARXIV_LEDGER=/path/ledger.db to never mail the same paper twice to a user,
+    # deliveries are forgotten after ARXIV_LEDGER_DAYS days
+    ledger_path = os.environ.get("ARXIV_LEDGER")
+    if ledger_path:
+        from arxivanalysis.ledger import SentLedger
+
+        ledger = SentLedger(ledger_path)
+        ledger.expire(int(os.environ.get("ARXIV_LEDGER_DAYS", "60")))
+        ledger.close()
+    # set ARXIV_SHARDS=n to match and render for users in n worker processes
+    workers = int(os.environ.get("ARXIV_SHARDS", "1"))
+    try:
+        if workers > 1:
+            return main_sharded(maildict, list(userdata), workers, ledger_path)
+        main_sequential(maildict, userdata, ledger_path)
+    finally:
+        _matchers.save()
+
+
+def main_sequential(maildict, userdata, ledger_path=None):
     for u in userdata:
         if u["valid"] is True:
             maildict["user"] = u["user"]
             maildict["user_alias"] = u["user_alias"]
-            choices = read_kw(u["choices"])
-            lst = Paperls(search_mode=2)
             for sub in u["subjects"]:
-                if sub in _paper_ls_dict:
-                    lst.merge(_paper_ls_dict[sub])
-                else:
-                    pl = Paperls(
-                        search_mode=2,
-                        search_query=sub,
-                        start=0,
-                        sort_by="submittedDate",
-                    )
-                    pl.tagging(stoppath)
-                    _paper_ls_dict[sub] = pl
-                    lst.merge(_paper_ls_dict[sub])
-            lst.interest_match(choices)
+                get_paperls(sub)
+            lst = user_papers(u, _paper_ls_dict, ledger_path)
             # print(lst.contents)
-            lst.mail(maildict)
+            ids = lst.mail(maildict)
+            if ledger_path:
+                open_ledger(ledger_path).add(u["user"], ids)
+    write_snapshots(_paper_ls_dict)
 
 
 if __name__ == "__main__":
-    curl_config()
-    main()
+    # set ARXIV_METRICS=/path/prefix to export per stage metrics as prefix.json and prefix.prom
+    metrics_prefix = os.environ.get("ARXIV_METRICS")
+    if metrics_prefix:
+        recorder = metrics.enable()
+    # set ARXIV_TRANSPORT=record:<dir> or replay:<dir> to record or replay arxiv responses,
+    # and ARXIV_SMTP_SINK=<dir> to write mails there, see arxivanalysis.transport
+    transport.install(transport.from_env())
+    try:
+        main(curl_config())
+    finally:
+        if metrics_prefix:
+            recorder.to_json(metrics_prefix + ".json")
+            recorder.to_prometheus(metrics_prefix + ".prom")
@@ -0,0 +1,57 @@
+"""
+run the matching service, eg.::
+
+    python scripts/serve.py cond-mat quant-ph --port 8765
+    python scripts/serve.py cond-mat --socket /tmp/arxiv.sock
+
+    curl -s localhost:8765/match -d '{"choices": ["topological"], "subjects": ["cond-mat"]}'
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, "./")
+from arxivanalysis.service import Service, make_server
+from arxivanalysis.matcher import MatcherCache
+
+stoppath = "./arxivanalysis/SmartStopList.txt"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="serve keyword matches and digests")
+    parser.add_argument("subjects", nargs="*", help="categories loaded at start")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="listen on this unix socket instead")
+    parser.add_argument(
+        "--refresh", type=float, default=600, help="seconds between listing checks"
+    )
+    parser.add_argument(
+        "--mode", type=int, default=0, help="0 for new, 1 for cross, 2 for both"
+    )
+    parser.add_argument(
+        "--matchers", type=int, default=256, help="max keyword sets kept compiled"
+    )
+    args = parser.parse_args(argv)
+
+    # set ARXIV_MATCHER_CACHE=/path/cache.json to start with the matchers of run-mail.py,
+    # it is only read, keyword sets of clients are never saved into it
+    matchers = MatcherCache(
+        os.environ.get("ARXIV_MATCHER_CACHE"), max_matchers=args.matchers
+    )
+    service = Service(args.subjects, stoppath, args.mode, matchers)
+    server = make_server(service, args.socket or (args.host, args.port))
+    service.start(args.refresh)
+    print("serving on %s" % (args.socket or "%s:%s" % (args.host, args.port)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
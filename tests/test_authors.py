@@ -0,0 +1,66 @@
+import pytest
+
+from arxivanalysis.authors import AuthorIndex, follow_all, name_tokens
+
+
+def paper(arxiv_id, *authors):
+    return {"arxiv_id": arxiv_id, "authors": list(authors)}
+
+
+@pytest.fixture
+def index():
+    return AuthorIndex(
+        [
+            paper("2405.00001", "Maria Rossi", "Bob Smith"),
+            paper("2405.00002", "M. Rossi"),
+            paper("2405.00003", "Marco Rossi"),
+            paper("2405.00004", "Jean-Pierre Dupont"),
+            paper("2405.00005", "J. P. Dupont"),
+            paper("2405.00006", "Dupont, Jean"),
+            paper("2405.00007", "Jacques Dupont"),
+        ]
+    )
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        # the followed name is the full one, the paper gives initials
+        ("Maria Rossi", {"2405.00001", "2405.00002"}),
+        ("Marco Rossi", {"2405.00002", "2405.00003"}),
+        ("Jean-Pierre Dupont", {"2405.00004", "2405.00005", "2405.00006"}),
+        ("Jean P. Dupont", {"2405.00004", "2405.00005", "2405.00006"}),
+        # the followed name gives initials, the paper the full one
+        ("M. Rossi", {"2405.00001", "2405.00002", "2405.00003"}),
+        ("J. P. Dupont", {"2405.00004", "2405.00005", "2405.00006", "2405.00007"}),
+        ("J.-P. Dupont", {"2405.00004", "2405.00005", "2405.00006", "2405.00007"}),
+        ("Jacques Dupont", {"2405.00005", "2405.00007"}),
+        ("Rossi, Maria", {"2405.00001", "2405.00002"}),
+        ("Alice Rossi", set()),
+        ("", set()),
+    ],
+)
+def test_lookup(index, name, expected):
+    assert index.lookup(name) == expected
+
+
+def test_contains(index):
+    assert "maria rossi" in index
+    assert "Alice Rossi" not in index
+
+
+def test_name_tokens():
+    assert name_tokens("José García-Pérez Jr.") == ["jose", "garcia-perez"]
+    assert name_tokens("J.-P. Dupont") == ["j", "p", "dupont"]
+
+
+def test_follow_all_merges_names_across_indexes():
+    a = AuthorIndex([paper("2405.00001", "Maria Rossi")])
+    b = AuthorIndex(
+        [paper("2405.00001", "Maria Rossi"), paper("2405.00002", "M. Rossi")]
+    )
+    hits = follow_all([a, b], ["Maria Rossi", "M. Rossi"])
+    assert hits == {
+        "2405.00001": ["Maria Rossi", "M. Rossi"],
+        "2405.00002": ["Maria Rossi", "M. Rossi"],
+    }
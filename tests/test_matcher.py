@@ -0,0 +1,59 @@
+import pytest
+
+from arxivanalysis.matcher import MatcherCache, normalize_choices
+
+text = "Topological entanglement entropy of a spin liquid on the kagome lattice"
+
+
+def test_normalize_choices():
+    assert normalize_choices([" spin liquid ", "", "kagome"]) == normalize_choices(
+        ["spin liquid", "kagome"]
+    )
+    assert normalize_choices({" kagome ": 2, "kagome": 3}) == {"kagome": 2}
+
+
+def test_identical_keywords_share_a_matcher():
+    cache = MatcherCache()
+    m = cache.get(["spin liquid", "kagome"])
+    # a list weights keywords by rank, in another order it is another keyword set
+    assert cache.get(["kagome", "spin liquid"]) is not m
+    assert cache.get(["spin liquid", "kagome"]) is m
+    assert cache.get({"spin liquid": m["spin liquid"], "kagome": m["kagome"]}) is m
+
+
+def test_bounded_cache_evicts_least_recently_used():
+    cache = MatcherCache(max_matchers=2)
+    a = cache.get(["spin liquid", "kagome"])
+    b = cache.get(["kagome", "entropy"])
+    for m in (a, b):
+        m.keyword_match(text)
+    cache.get(["spin liquid", "kagome"])
+    c = cache.get(["quasicrystal"])
+    c.keyword_match(text)
+    assert list(cache.matchers) == [a.key, c.key]
+    assert b.key not in cache.compiled
+    # kagome is still used by a, entropy by no cached matcher
+    assert set(cache.text_state(text)[1]) == {"spin liquid", "kagome", "quasicrystal"}
+
+
+def test_unbounded_cache_keeps_all():
+    cache = MatcherCache()
+    for i in range(50):
+        cache.get(["keyword %s" % i])
+    assert len(cache.matchers) == 50
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = MatcherCache(path)
+    m = cache.get(["spin liquid", "kagome"])
+    cache.save()
+    loaded = MatcherCache(path)
+    assert loaded.get(["spin liquid", "kagome"]).compiled == m.compiled
+    assert loaded.hits == 1
+
+
+@pytest.mark.parametrize("choices", [{"kagome": 1}, ["kagome"]])
+def test_keyword_match(choices):
+    r = MatcherCache().get(choices).keyword_match(text)
+    assert [kw for kw, _, _ in r] == ["kagome"]
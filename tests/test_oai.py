@@ -0,0 +1,137 @@
+from xml.sax.saxutils import escape
+
+import pytest
+
+from arxivanalysis import oai, transport
+from arxivanalysis.store import Store
+
+from_date = "2024-05-13"
+key = "oai:%s::%s:" % (oai.oai_url, from_date)
+per_page = 10
+# the record of index 3 is sent as deleted
+deleted = {3}
+
+
+def page(start, n, token=None):
+    records = []
+    for i in range(start, start + n):
+        arxiv_id = "2405.%05d" % (i + 1)
+        header = "<identifier>oai:arXiv.org:%s</identifier>" % arxiv_id
+        if i in deleted:
+            records.append(
+                '<record><header status="deleted">%s</header></record>' % header
+            )
+            continue
+        records.append(
+            "<record><header>%s</header><metadata>"
+            '<arXiv xmlns="http://arxiv.org/OAI/arXiv/">'
+            "<id>%s</id><created>2024-05-%02d</created><authors><author>"
+            "<keyname>Rossi</keyname><forenames>Maria</forenames></author></authors>"
+            "<title>%s</title><categories>quant-ph cond-mat.str-el</categories>"
+            "<abstract>%s</abstract></arXiv></metadata></record>"
+            % (
+                header,
+                arxiv_id,
+                13 + i % 5,
+                escape("Paper %s on spin liquids & entanglement" % i),
+                "We study a model.",
+            )
+        )
+    return response(
+        "<ListRecords>%s<resumptionToken>%s</resumptionToken></ListRecords>"
+        % ("".join(records), token or "")
+    )
+
+
+def response(body):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">'
+        "<responseDate>2024-05-20T17:00:00Z</responseDate>%s</OAI-PMH>" % body
+    ).encode("utf-8")
+
+
+def error(code):
+    return response('<error code="%s">%s</error>' % (code, "rejected"))
+
+
+def record(path, pages, rejected=()):
+    """
+    recordings of a harvest of the given pages, the pages with None are missing,
+    and the tokens in rejected are answered with badResumptionToken
+    """
+    path.mkdir(exist_ok=True)
+    tokens = [None] + ["page-%s" % i for i in range(1, len(pages))]
+    for i, (token, body) in enumerate(zip(tokens, pages)):
+        if body is not None:
+            url = oai.list_records_url(from_date=from_date, resumption_token=token)
+            transport.save_recording(str(path), url, 200, [], body)
+    for token in rejected:
+        url = oai.list_records_url(from_date=from_date, resumption_token=token)
+        transport.save_recording(str(path), url, 200, [], error("badResumptionToken"))
+    return str(path)
+
+
+def pages(n=3):
+    return [
+        page(i * per_page, per_page, "page-%s" % (i + 1) if i + 1 < n else None)
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def store():
+    return Store(":memory:")
+
+
+def harvest(path, store):
+    previous = transport.install(transport.ReplayTransport(path))
+    try:
+        return oai.harvest(store, from_date=from_date, delay=0)
+    finally:
+        transport.install(previous)
+
+
+def test_harvest(tmp_path, store):
+    assert harvest(record(tmp_path, pages()), store) == 3 * per_page - 1
+    assert store.get_state(key) is None
+    c = store.get("2405.00001")
+    assert c["authors"] == ["Maria Rossi"]
+    assert c["subject_abbr"] == ["quant-ph", "cond-mat.str-el"]
+    assert "2405.00004" not in store
+
+
+def test_interrupted_harvest_resumes_from_checkpoint(tmp_path, store):
+    full = pages()
+    partial = record(tmp_path / "partial", full[:2] + [None])
+    with pytest.raises(transport.TransportError):
+        harvest(partial, store)
+    assert len(store) == 2 * per_page - 1
+    assert store.get_state(key) == "page-2"
+    assert harvest(record(tmp_path / "full", full), store) == per_page
+    assert len(store) == 3 * per_page - 1
+    assert store.get_state(key) is None
+
+
+def test_expired_checkpoint_restarts_from_the_first_page(tmp_path, store):
+    store.set_state(key, "expired")
+    path = record(tmp_path, pages(), rejected=["expired"])
+    assert harvest(path, store) == 3 * per_page - 1
+    assert store.get_state(key) is None
+
+
+def test_token_rejected_within_a_run_is_not_restarted(tmp_path, store):
+    # an earlier checkpoint is accepted, the token issued after it is not
+    store.set_state(key, "page-1")
+    path = record(tmp_path, pages()[:2], rejected=["page-2"])
+    with pytest.raises(oai.OAIException) as e:
+        harvest(path, store)
+    assert e.value.code == "badResumptionToken"
+    assert store.get_state(key) == "page-2"
+    assert len(store) == per_page
+
+
+def test_no_records_match(tmp_path, store):
+    url = oai.list_records_url(from_date=from_date)
+    transport.save_recording(str(tmp_path), url, 200, [], error("noRecordsMatch"))
+    assert harvest(str(tmp_path), store) == 0
@@ -0,0 +1,51 @@
+import os
+import random
+
+from arxivanalysis.pipeline import Pipeline, bounded_map, match, select, tag
+
+stoppath = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "arxivanalysis",
+    "SmartStopList.txt",
+)
+
+_words = (
+    "topological phase transition entanglement entropy spin liquid kagome lattice "
+    "we study the of a model and show that quantum critical point"
+).split()
+
+
+def papers(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "arxiv_id": "2405.%05d" % (i + 1),
+            "title": " ".join(rng.choice(_words) for _ in range(8)),
+            "summary": " ".join(rng.choice(_words) for _ in range(60)) + ".",
+            "authors": ["Maria Rossi"],
+        }
+        for i in range(n)
+    ]
+
+
+def test_bounded_map_keeps_order():
+    r = list(bounded_map(abs, range(-20, 0), workers=3, window=4, executor="thread"))
+    assert r == list(range(20, 0, -1))
+
+
+def test_parallel_tagging_in_buffered_stages_matches_sequential():
+    # the tag stage runs in a buffered thread next to the other stages
+    sequential = list(Pipeline(papers(30)).pipe(tag, stoppath))
+    parallel = list(Pipeline(papers(30)).pipe(tag, stoppath, workers=2, window=5))
+    assert [c["tags"] for c in parallel] == [c["tags"] for c in sequential]
+
+
+def test_match_and_select():
+    selected = list(
+        Pipeline(papers(30))
+        .pipe(match, {"kagome lattice": 2, "spin liquid": 1})
+        .pipe(select, top=5)
+    )
+    weights = [c["weight"] for c in selected]
+    assert 0 < len(selected) <= 5
+    assert weights == sorted(weights, reverse=True)
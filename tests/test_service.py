@@ -0,0 +1,62 @@
+import os
+import json
+import threading
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+
+import pytest
+
+from arxivanalysis.service import Service, ServiceError, make_server
+
+stoppath = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "arxivanalysis",
+    "SmartStopList.txt",
+)
+
+
+@pytest.fixture
+def service():
+    # no subject is loaded, a request reaching a fetch fails the test
+    return Service((), stoppath, list_url="http://127.0.0.1:9/%s")
+
+
+@pytest.fixture
+def url(service):
+    server = make_server(service, ("127.0.0.1", 0))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield "http://127.0.0.1:%s" % server.server_port
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, body):
+    data = json.dumps(body).encode("utf-8")
+    try:
+        with urlopen(Request(url, data=data), timeout=10) as resp:
+            return resp.status
+    except HTTPError as e:
+        return e.code
+
+
+def test_unknown_subjects_are_never_fetched(service):
+    with pytest.raises(ServiceError):
+        service.match(["kagome"], ["../../etc"])
+    assert service.status() == {}
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"choices": "/etc/passwd", "subjects": ["quant-ph"]},
+        {"choices": ["kagome"], "subjects": ["not-a-category"]},
+        {"choices": ["kagome"], "subjects": "quant-ph", "top": "3"},
+        {"choices": {"kagome": "high"}, "subjects": ["quant-ph"]},
+        ["kagome"],
+    ],
+)
+def test_bad_requests(url, service, body):
+    assert post(url + "/match", body) == 400
+    assert service.status() == {}
@@ -0,0 +1,55 @@
+import pytest
+
+from arxivanalysis.paperls import Paperls
+from arxivanalysis.snapshot import SnapshotError, Snapshot, load, write_snapshot
+
+
+def paper(arxiv_id, title, **fields):
+    c = {
+        "arxiv_id": arxiv_id,
+        "arxiv_url": "https://arxiv.org/abs/" + arxiv_id,
+        "title": title,
+        "summary": "We study " + title.lower() + ".",
+        "authors": ["Maria Rossi", "J. P. Dupont"],
+        "subject": ["Quantum Physics (quant-ph)"],
+        "subject_abbr": ["quant-ph"],
+        "announce_date": "2024-05-20",
+    }
+    c.update(fields)
+    return c
+
+
+@pytest.fixture
+def contents():
+    return [
+        paper("2405.00001", "Topological order", tags=[("topological order", 4.0)]),
+        paper("2405.00002", "Entanglement entropy", tags=[]),
+        paper("2405.00003", "Topological entanglement"),
+    ]
+
+
+def test_round_trip(tmp_path, contents):
+    path = write_snapshot(contents, str(tmp_path / "quant-ph.snap"))
+    with Snapshot(path) as snap:
+        assert len(snap) == 3
+        for c, p in zip(contents, snap):
+            assert dict(p) == dict(c, tags=c.get("tags"))
+        assert snap.find("2405.00003")["tags"] is None
+        assert snap.find("2405.99999") is None
+
+
+def test_untagged_papers_match_like_paperls(tmp_path, contents):
+    path = write_snapshot(contents, str(tmp_path / "quant-ph.snap"))
+    lists = [Paperls.from_contents(contents), load(path)]
+    for pl in lists:
+        pl.interest_match({"topological": 1})
+    plain, snapped = [pl.show_relevant(purify=True) for pl in lists]
+    assert [c["arxiv_id"] for c in snapped] == ["2405.00001", "2405.00003"]
+    assert snapped == plain
+
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / "x.snap"
+    path.write_bytes(b"not a snapshot" * 10)
+    with pytest.raises(SnapshotError):
+        Snapshot(str(path))